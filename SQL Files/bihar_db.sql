@@ -104,7 +104,12 @@ CREATE TABLE hadiths (
     h_matn_en TEXT NOT NULL, -- Main hadith text
     h_explanation_ar TEXT, -- Optional explanation in ar
     h_explanation_en TEXT, -- Optional explanation in en
-    h_normalized_text TEXT, -- For search optimization (cleaned, stemmed)
+    h_normalized_text TEXT GENERATED ALWAYS AS (
+        lower(btrim(regexp_replace(
+            regexp_replace(h_matn_en || ' ' || h_matn_ar || ' ' || COALESCE(h_isnad_en, ''), '[^[:alnum:][:space:]_]', ' ', 'g'),
+            '\s+', ' ', 'g'
+        )))
+    ) STORED, -- For search optimization (punctuation stripped, whitespace collapsed, lowercased)
     h_text_quality_score DECIMAL(3,2) DEFAULT 0.0,
     h_topics TEXT[], -- Array of topic keywords
     h_c_id INTEGER NOT NULL,
@@ -229,7 +234,7 @@ CREATE TABLE embeddings (
     emb_sd_id INTEGER NOT NULL,
     emb_model embedding_model NOT NULL,
     emb_version VARCHAR(50) DEFAULT 'v1',
-    emb_embedding VECTOR(768), -- Adjust dimension as needed
+    emb_embedding HALFVEC(768), -- FP16 (1.5 KB/row, pgvector >= 0.7); adjust dimension as needed
     emb_is_active BOOLEAN DEFAULT TRUE, -- For A/B testing during model migrations
     -- audit and logs
     created_by VARCHAR(100) NOT NULL DEFAULT current_user,
@@ -272,11 +277,15 @@ CREATE INDEX idx_embeddings_model_version ON embeddings(emb_model, emb_version,
 
 -- Text search indexes
 CREATE INDEX idx_hadiths_normalized_gin ON hadiths USING GIN(to_tsvector('english', h_normalized_text)) WHERE is_deleted = false;
+CREATE INDEX idx_hadiths_normalized_trgm ON hadiths USING GIN(h_normalized_text gin_trgm_ops) WHERE is_deleted = false;
 CREATE INDEX idx_search_docs_normalized_gin ON search_documents USING GIN(to_tsvector('english', sd_normalized_content)) WHERE is_deleted = false;
 
 
 -- MISSING: Vector similarity search index
-CREATE INDEX idx_embeddings_vector ON embeddings USING ivfflat (emb_embedding vector_cosine_ops) WITH (lists = 100) WHERE is_deleted = false AND emb_is_active = true;
+-- HNSW keeps recall high as volumes are added, unlike ivfflat with fixed lists and probes = 1.
+-- Tune recall per query with: SET LOCAL hnsw.ef_search = 40; query vectors bind as $1::halfvec(768)
+-- Rollback: DROP INDEX idx_embeddings_vector; recreate it USING ivfflat (emb_embedding halfvec_cosine_ops) WITH (lists = 100)
+CREATE INDEX idx_embeddings_vector ON embeddings USING hnsw (emb_embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64) WHERE is_deleted = false AND emb_is_active = true;
 
 -- MISSING: Active embeddings filter
 CREATE INDEX idx_embeddings_active_lookup ON embeddings(emb_sd_id, emb_is_active) WHERE emb_is_active = true AND is_deleted = false;
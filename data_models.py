@@ -1,40 +1,118 @@
 # data_models.py - Python Data Models for Bihar ul Anwar Final Schema
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Any
-from enum import Enum
+from dataclasses import dataclass, field, fields, MISSING
+from typing import List, Dict, Optional, Any, Tuple, Literal, Mapping, Sequence
+from types import MappingProxyType
 from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 import json
+import re
+import numpy as np
 
-class ContentType(Enum):
-    HADITH = "hadith"
-    VERSE = "verse"
-    COMMENTARY = "commentary"
-    CHAPTER_HEADER = "chapter_header"
-    NAVIGATION = "navigation"
-
-class EmbeddingModel(Enum):
-    GEMINI_TEXT_EMBEDDING_004 = "gemini-text-embedding-004"
-    LLAMA_EMBEDDING = "llama-embedding"
-    QWEN_EMBEDDING = "qwen-embedding"
-
-class LanguageCode(Enum):
-    ARABIC = "ar"
-    ENGLISH = "en"
-    URDU = "ur"
-    PERSIAN = "fa"
-
-@dataclass
+def _json_default(obj: Any) -> Any:
+    """Encode read-only mappings (e.g. the shared empty sd_chunk_metadata) as objects"""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+# JSON codec for h_raw_json / sd_chunk_metadata: orjson when installed, stdlib otherwise
+try:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a JSON string (handles datetime, numpy arrays and any Mapping)"""
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    loads = orjson.loads
+except ImportError:
+    def dumps(obj: Any) -> str:
+        """Serialize to a JSON string (handles any Mapping)"""
+        return json.dumps(obj, default=_json_default)
+
+    loads = json.loads
+
+# Precompiled pattern for the reference parser
+_REF_RE = re.compile(r'BH_V(\d+)_C(\d+)_H(\d+)')
+
+class _NormalizeTable(dict):
+    """Lazy str.translate table mapping non-word, non-space characters to a space"""
+    # Same character classes as [^\w\s]: Arabic letters are kept, harakat are not
+    def __missing__(self, codepoint: int) -> int:
+        char = chr(codepoint)
+        keep = char.isalnum() or char == '_' or char.isspace()
+        self[codepoint] = codepoint if keep else 32
+        return self[codepoint]
+
+_NORMALIZE_TABLE = _NormalizeTable()
+
+def _normalize(text: str) -> str:
+    """Replace punctuation, collapse whitespace and lowercase in one pass"""
+    return ' '.join(text.translate(_NORMALIZE_TABLE).lower().split())
+
+# Shared timestamp for objects created inside a batch_timestamp() block
+_batch_now: ContextVar[Optional[datetime]] = ContextVar("batch_now", default=None)
+
+def _now() -> datetime:
+    """Current batch timestamp if one is active, else datetime.now()"""
+    return _batch_now.get() or datetime.now()
+
+@contextmanager
+def batch_timestamp():
+    """Stamp every model created in this block with one shared datetime"""
+    token = _batch_now.set(datetime.now())
+    try:
+        yield _batch_now.get()
+    finally:
+        _batch_now.reset(token)
+
+# Value sets mirror the content_type, embedding_model and language_code SQL enums
+ContentType = Literal["hadith", "verse", "commentary", "chapter_header", "navigation"]
+
+EmbeddingModel = Literal["gemini-text-embedding-004", "llama-embedding", "qwen-embedding"]
+
+LanguageCode = Literal["ar", "en", "ur", "fa"]
+
+# Hadith attribute holding each available language
+_MATN_BY_LANGUAGE = {"ar": "h_matn_ar", "en": "h_matn_en"}
+_ISNAD_BY_LANGUAGE = {"ar": "h_isnad_ar", "en": "h_isnad_en"}
+
+# Shared read-only default for search documents without chunk metadata
+_EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+@lru_cache(maxsize=None)
+def _field_defaults(cls) -> Tuple[Tuple[str, Any, Any], ...]:
+    """Field names with their defaults, computed once per model class"""
+    return tuple((f.name, f.default, f.default_factory) for f in fields(cls))
+
+@dataclass(slots=True)
 class BaseModel:
     """Base model with audit fields"""
     created_by: str = "system"
-    created_at: datetime = field(default_factory=datetime.now)
+    created_at: datetime = field(default_factory=_now)
     modified_by: str = "system"
-    modified_at: datetime = field(default_factory=datetime.now)
+    modified_at: datetime = field(default_factory=_now)
     is_deleted: bool = False
     deleted_at: Optional[datetime] = None
     deleted_by: Optional[str] = None
 
-@dataclass
+    @classmethod
+    def from_trusted(cls, **values):
+        """Build an instance from already-validated data (e.g. a DB row) without running __post_init__"""
+        obj = cls.__new__(cls)
+        for name, default, default_factory in _field_defaults(cls):
+            if name in values:
+                value = values[name]
+            elif default is not MISSING:
+                value = default
+            elif default_factory is not MISSING:
+                value = default_factory()
+            else:
+                continue
+            object.__setattr__(obj, name, value)
+        return obj
+
+@dataclass(slots=True)
 class Topic(BaseModel):
     """Topic classification for hadiths and chapters"""
     t_id: Optional[int] = None
@@ -45,7 +123,7 @@ class Topic(BaseModel):
         if not self.topic_name_en and not self.topic_name_ar:
             raise ValueError("At least one of topic_name_en or topic_name_ar is required")
 
-@dataclass
+@dataclass(slots=True)
 class Volume(BaseModel):
     """Bihar ul Anwar Volume"""
     v_id: Optional[int] = None
@@ -72,7 +150,7 @@ class Volume(BaseModel):
     def display_name(self) -> str:
         return self.v_name_en or self.v_name_ar or f"Volume {self.v_no}"
 
-@dataclass
+@dataclass(slots=True)
 class Chapter(BaseModel):
     """Chapter within a volume"""
     c_id: Optional[int] = None
@@ -83,7 +161,7 @@ class Chapter(BaseModel):
     c_total_verses: int = 0
     c_description_en: str = ""
     c_description_ar: str = ""
-    c_topic_keywords: List[str] = field(default_factory=list)
+    c_topic_keywords: Sequence[str] = ()
     c_v_id: int = 0  # Foreign key to volumes
 
     @property
@@ -94,7 +172,7 @@ class Chapter(BaseModel):
     def has_content(self) -> bool:
         return self.c_total_hadith > 0 or self.c_total_verses > 0
 
-@dataclass
+@dataclass(slots=True)
 class Hadith(BaseModel):
     """Complete hadith with all metadata"""
     h_id: Optional[int] = None
@@ -111,15 +189,16 @@ class Hadith(BaseModel):
     h_matn_en: str = ""  # Main hadith text (required)
     h_explanation_ar: str = ""  # Optional explanation
     h_explanation_en: str = ""  # Optional explanation
-    h_normalized_text: str = ""  # For search optimization
+    h_normalized_text: str = ""  # For search optimization (generated column in Postgres)
     h_text_quality_score: float = 0.0
-    h_topics: List[str] = field(default_factory=list)
+    h_topics: Sequence[str] = ()
     h_c_id: int = 0  # Foreign key to chapters
-    h_raw_json: Dict[str, Any] = field(default_factory=dict)
+    h_raw_json: Optional[Dict[str, Any]] = None  # Only set when raw data is kept
     h_extraction_confidence: float = 0.0
     h_is_verified: bool = False
     h_verified_by: Optional[str] = None
     h_verified_at: Optional[datetime] = None
+    _citation: str = field(default="", init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if not self.h_matn_ar:
@@ -133,13 +212,15 @@ class Hadith(BaseModel):
     
     def _generate_normalized_text(self) -> str:
         """Generate normalized text for search"""
-        import re
         # Combine English and Arabic text
         combined = f"{self.h_matn_en} {self.h_matn_ar} {self.h_isnad_en}"
         # Basic normalization
-        normalized = re.sub(r'\s+', ' ', combined.strip())
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)
-        return normalized.lower()
+        return _normalize(combined)
+    
+    @property
+    def raw_json(self) -> Dict[str, Any]:
+        """Raw parsed data, or an empty dict if none was stored"""
+        return self.h_raw_json if self.h_raw_json is not None else {}
     
     @property
     def is_bilingual(self) -> bool:
@@ -151,32 +232,35 @@ class Hadith(BaseModel):
         """Check if hadith has chain of narration"""
         return bool(self.h_isnad_ar or self.h_isnad_en)
     
-    @property
-    def full_citation(self) -> str:
-        """Get formatted citation"""
+    def _build_citation(self) -> str:
+        """Format the citation once from the parsed reference"""
         if self.h_hadith_ref:
             # Parse BH_V1_C2_H3 format
+            match = _REF_RE.match(self.h_hadith_ref)
+            if match:
+                return "Bihar ul Anwar, Volume {}, Chapter {}, Hadith {}".format(*map(int, match.groups()))
             parts = self.h_hadith_ref.replace('BH_V', '').replace('_C', ', Chapter ').replace('_H', ', Hadith ')
             return f"Bihar ul Anwar, Volume {parts}"
         return f"Bihar ul Anwar, Volume ?, Chapter ?, Hadith {self.h_no}"
     
+    @property
+    def full_citation(self) -> str:
+        """Get formatted citation"""
+        if not self._citation:
+            self._citation = self._build_citation()
+        return self._citation
+    
     def get_text_by_language(self, language: LanguageCode) -> Optional[str]:
         """Get hadith text in specific language"""
-        if language == LanguageCode.ARABIC:
-            return self.h_matn_ar
-        elif language == LanguageCode.ENGLISH:
-            return self.h_matn_en
-        return None
+        attr = _MATN_BY_LANGUAGE.get(language)
+        return getattr(self, attr) if attr else None
     
     def get_isnad_by_language(self, language: LanguageCode) -> Optional[str]:
         """Get isnad in specific language"""
-        if language == LanguageCode.ARABIC:
-            return self.h_isnad_ar
-        elif language == LanguageCode.ENGLISH:
-            return self.h_isnad_en
-        return None
+        attr = _ISNAD_BY_LANGUAGE.get(language)
+        return getattr(self, attr) if attr else None
 
-@dataclass
+@dataclass(slots=True)
 class Verse(BaseModel):
     """Quranic verse referenced in a chapter"""
     vr_id: Optional[int] = None
@@ -211,20 +295,20 @@ class Verse(BaseModel):
         surah_name = self.vr_surah_name_en or f"Surah {self.vr_surah_no}"
         return f"{surah_name} {self.ayah_range}"
 
-@dataclass
+@dataclass(slots=True)
 class Edition(BaseModel):
     """Publication edition for page references"""
     e_id: Optional[int] = None
     e_name: str = ""
     e_publisher: str = ""
     e_year_published: int = 0
-    e_language: LanguageCode = LanguageCode.ARABIC
+    e_language: LanguageCode = "ar"
     e_is_canonical: bool = False
     e_pdf_available: bool = False
     e_total_volumes: int = 110
     e_notes: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class HadithPage(BaseModel):
     """Page reference for hadith in specific edition"""
     hp_id: Optional[int] = None
@@ -246,16 +330,16 @@ class HadithPage(BaseModel):
             return f"pp. {self.hp_page_start}-{self.hp_page_end}"
         return f"p. {self.hp_page_start}"
 
-@dataclass
+@dataclass(slots=True)
 class SearchDocument(BaseModel):
     """Document for RAG retrieval"""
     sd_id: Optional[int] = None
     sd_hadith_ref: str = ""  # References hadiths.h_hadith_ref
-    sd_content_type: ContentType = ContentType.HADITH
-    sd_language: LanguageCode = LanguageCode.ENGLISH
+    sd_content_type: ContentType = "hadith"
+    sd_language: LanguageCode = "en"
     sd_content: str = ""
     sd_normalized_content: str = ""
-    sd_chunk_metadata: Dict[str, Any] = field(default_factory=dict)
+    sd_chunk_metadata: Mapping[str, Any] = field(default_factory=lambda: _EMPTY_METADATA)
     sd_chunk_size: int = 0
 
     def __post_init__(self):
@@ -271,43 +355,90 @@ class SearchDocument(BaseModel):
     
     def _normalize_content(self) -> str:
         """Normalize content for search"""
-        import re
-        normalized = re.sub(r'\s+', ' ', self.sd_content.strip())
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)
-        return normalized.lower()
+        return _normalize(self.sd_content)
 
-@dataclass
+@dataclass(slots=True)
 class Embedding(BaseModel):
     """Vector embedding for semantic search"""
     emb_id: Optional[int] = None
     emb_sd_id: int = 0  # Foreign key to search_documents
-    emb_model: EmbeddingModel = EmbeddingModel.GEMINI_TEXT_EMBEDDING_004
+    emb_model: EmbeddingModel = "gemini-text-embedding-004"
     emb_version: str = "v1"
-    emb_embedding: List[float] = field(default_factory=list)
+    emb_embedding: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
     emb_is_active: bool = True
+    emb_quantized: Optional[np.ndarray] = None  # int8 copy of emb_embedding
+    emb_scale: float = 0.0  # Per-vector scale for emb_quantized
 
     def __post_init__(self):
-        if not self.emb_embedding:
+        # Keep vectors as one contiguous float32 buffer (no copy if already float32)
+        self.emb_embedding = np.asarray(self.emb_embedding, dtype=np.float32)
+        if self.emb_embedding.size == 0:
             raise ValueError("Embedding vector is required")
-        if len(self.emb_embedding) != 768:  # Assuming 768-dimensional embeddings
-            print(f"Warning: Expected 768-dimensional embedding, got {len(self.emb_embedding)}")
+        if self.emb_embedding.size != 768:  # Assuming 768-dimensional embeddings
+            print(f"Warning: Expected 768-dimensional embedding, got {self.emb_embedding.size}")
+        
+        # Generate int8 copy if not provided
+        if self.emb_quantized is None:
+            self.emb_quantized, self.emb_scale = quantize_embedding(self.emb_embedding)
+
+    def __eq__(self, other):
+        # The generated __eq__ compares field tuples, which is ambiguous for ndarrays
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        for name, _, _ in _field_defaults(self.__class__):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if isinstance(mine, np.ndarray) or isinstance(theirs, np.ndarray):
+                if mine is None or theirs is None or not np.array_equal(mine, theirs):
+                    return False
+            elif mine != theirs:
+                return False
+        return True
+
+    @classmethod
+    def from_list(cls, values: List[float], **kwargs) -> "Embedding":
+        """Build an embedding from a plain list (e.g. a pgvector/API result)"""
+        return cls(emb_embedding=np.asarray(values, dtype=np.float32), **kwargs)
 
 # Utility functions for data manipulation
+def quantize_embedding(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Quantize a float vector to int8 with a single per-vector scale"""
+    vector = np.asarray(vector, dtype=np.float32)
+    max_abs = float(np.abs(vector).max()) if vector.size else 0.0
+    if max_abs == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8), 0.0
+    scale = max_abs / 127.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+def dequantize_embedding(quantized: np.ndarray, scale: float) -> np.ndarray:
+    """Recover an approximate float32 vector from its int8 form"""
+    return quantized.astype(np.float32) * np.float32(scale)
+
+def quantized_dot(q_a: np.ndarray, scale_a: float, q_b: np.ndarray, scale_b: float) -> float:
+    """Approximate dot product of two int8-quantized vectors"""
+    # Accumulate in int32 so 768 int8 products cannot overflow
+    return int(np.dot(q_a.astype(np.int32), q_b.astype(np.int32))) * scale_a * scale_b
+
 def generate_hadith_ref(volume_no: int, chapter_no: int, hadith_no: int) -> str:
     """Generate canonical hadith reference"""
     return f"BH_V{volume_no}_C{chapter_no}_H{hadith_no}"
 
-def parse_hadith_ref(hadith_ref: str) -> Dict[str, int]:
-    """Parse hadith reference into components"""
-    import re
-    match = re.match(r'BH_V(\d+)_C(\d+)_H(\d+)', hadith_ref)
+@lru_cache(maxsize=1 << 16)
+def parse_hadith_ref_parts(hadith_ref: str) -> Tuple[int, int, int]:
+    """Parse hadith reference into a cached (volume, chapter, hadith) tuple"""
+    match = _REF_RE.match(hadith_ref)
     if not match:
         raise ValueError(f"Invalid hadith reference format: {hadith_ref}")
     
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+def parse_hadith_ref(hadith_ref: str) -> Dict[str, int]:
+    """Parse hadith reference into components"""
+    volume, chapter, hadith = parse_hadith_ref_parts(hadith_ref)
+    
     return {
-        'volume': int(match.group(1)),
-        'chapter': int(match.group(2)),
-        'hadith': int(match.group(3))
+        'volume': volume,
+        'chapter': chapter,
+        'hadith': hadith
     }
 
 def validate_hadith_data(hadith: Hadith) -> Dict[str, bool]:
@@ -0,0 +1,238 @@
+# cache.py - Response caches for the query endpoint
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import functools
+import numpy as np
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import REDIS_URL
+
+log = logging.getLogger(__name__)
+
+# Shared cache backend for multi-worker deployments: redis when installed and configured
+try:
+    import redis
+except ImportError:
+    redis = None
+
+def response_cache_key(query: str, top_k: int, volume_filter: Optional[int], include_arabic: bool) -> str:
+    """SHA-256 key for a byte-identical /query request"""
+    return hashlib.sha256(f"{query}|{top_k}|{volume_filter}|{include_arabic}".encode()).hexdigest()
+
+class TTLCache:
+    """LRU mapping whose entries also expire ttl_seconds after insertion"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Live value for key, or None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any):
+        """Store value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+@functools.lru_cache(maxsize=1)
+def get_redis_client():
+    """Redis client for REDIS_URL, or None when Redis is not configured or installed"""
+    if not REDIS_URL:
+        return None
+    if redis is None:
+        log.warning("⚠️ REDIS_URL is set but the redis package is not installed; caches stay per-process")
+        return None
+    return redis.Redis.from_url(REDIS_URL)
+
+class RedisTTLCache:
+    """TTLCache interface over Redis keys, so every server worker shares one cache
+
+    Capacity is bounded by the server's maxmemory rather than maxsize, which needs
+    maxmemory-policy allkeys-lru; every key also carries the cache's TTL. Redis errors are logged and treated as misses, so an unreachable server only
+    costs the cache, not the request.
+    """
+
+    def __init__(self, client, prefix: str, ttl_seconds: float,
+                 dumps: Callable[[Any], bytes] = bytes, loads: Callable[[bytes], Any] = bytes):
+        self.client = client
+        self.prefix = prefix
+        if not math.isfinite(ttl_seconds):
+            raise ValueError(f"Redis cache {prefix} needs a finite TTL")
+        self.ttl_seconds = ttl_seconds
+        self.dumps = dumps
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Live value for key, or None"""
+        try:
+            raw = self.client.get(self._key(key))
+        except redis.RedisError as e:
+            log.warning("⚠️ Redis get failed for %s: %s", self.prefix, e)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.loads(raw)
+
+    def set(self, key: Hashable, value: Any):
+        """Store value with the cache's TTL"""
+        try:
+            self.client.set(self._key(key), self.dumps(value), ex=int(self.ttl_seconds))
+            self.sets += 1
+        except redis.RedisError as e:
+            log.warning("⚠️ Redis set failed for %s: %s", self.prefix, e)
+
+    def clear(self):
+        """Drop every key under this cache's prefix"""
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=f"{self.prefix}:*", count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                self.client.unlink(*batch)
+        except redis.RedisError as e:
+            log.warning("⚠️ Redis clear failed for %s: %s", self.prefix, e)
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """This worker's hit/miss/set counters; the shared size is not tracked"""
+        # Counting keys would SCAN the whole prefix on every stats call
+        return {
+            'size': None,
+            'sets': self.sets,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0
+        }
+
+def make_ttl_cache(prefix: str, maxsize: int, ttl_seconds: float,
+                   dumps: Callable[[Any], bytes] = bytes, loads: Callable[[bytes], Any] = bytes):
+    """RedisTTLCache when Redis is configured, otherwise an in-process TTLCache"""
+    client = get_redis_client()
+    if client is None:
+        return TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+    return RedisTTLCache(client, prefix, ttl_seconds, dumps=dumps, loads=loads)
+
+class SemanticCache:
+    """Responses of earlier queries, reused when a new query embeds close enough to one"""
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float, dim: int = 768):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # L2-normalized rows stored as int8 with a per-row scale, a quarter of the float32 size
+        self._vectors = np.zeros((max_entries, dim), dtype=np.int8)
+        self._scales = np.zeros(max_entries, dtype=np.float32)
+        self._entries = [None] * max_entries                            # (scope, response, expires_at)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        """Unit-length float32 copy of an embedding, or None for a zero vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Symmetric int8 quantization: vector ~= q * scale"""
+        scale = float(np.abs(vector).max()) / 127
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def lookup(self, embedding, scope: Tuple) -> Optional[Dict]:
+        """Cached response for the most similar live entry with the same scope, if above threshold"""
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            # Inner products of unit vectors are cosine similarities; the query stays float32
+            scores = (self._vectors[:self._size] @ query) * self._scales[:self._size]
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for i in candidates[np.argsort(-scores[candidates])]:
+                entry_scope, response, expires_at = self._entries[i]
+                if entry_scope == scope and expires_at > now:
+                    self.hits += 1
+                    return response
+            self.misses += 1
+            return None
+
+    def insert(self, embedding, scope: Tuple, response: Dict):
+        """Store a response, overwriting the oldest entry once full"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+
+        with self._lock:
+            slot = self._next
+            self._vectors[slot], self._scales[slot] = self._quantize(vector)
+            self._entries[slot] = (scope, response, time.monotonic() + self.ttl_seconds)
+            self._next = (slot + 1) % self.max_entries
+            self._size = max(self._size, slot + 1)
+
+    def stats(self) -> Dict[str, int]:
+        """Size and hit/miss counters"""
+        with self._lock:
+            return {'size': self._size, 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Drop every entry, e.g. after new volumes are loaded"""
+        with self._lock:
+            self._vectors[:] = 0
+            self._scales[:] = 0
+            self._entries = [None] * self.max_entries
+            self._next = 0
+            self._size = 0
@@ -1,10 +1,16 @@
 # config_optimized.py - Optimized configuration for better performance
 import os
+import math
+import functools
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+log = logging.getLogger(__name__)
 
 # ===================== OPTIMIZED TIMEOUTS =====================
 API_TIMEOUT = 300       # 5 minutes (reduced from 2 minutes)
@@ -12,21 +18,92 @@ GEMINI_TIMEOUT = 180    # 3 minutes (reduced from 1.5 minutes)
 PROCESSING_TIMEOUT = 900  # 15 minutes for large volumes
 
 # ===================== Configuration =====================
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+@dataclass(frozen=True)
+class _Cfg:
+    """Environment-derived settings, read once per process"""
+    google_api_key: Optional[str]
+    db_host: str
+    db_port: int
+    db_name: str
+    db_user: str
+    db_password: Optional[str]
+    semantic_cache_threshold: float
+    direct_answer_threshold: float
+    web_concurrency: int
+    dev_mode: bool
+    redis_url: Optional[str]
+    pdf_root: Optional[str]
+
+@functools.lru_cache(maxsize=1)
+def get_config() -> _Cfg:
+    """Load .env and snapshot the environment into a cached _Cfg"""
+    load_dotenv()
+    env = os.environ
+    return _Cfg(
+        google_api_key=env.get('GOOGLE_API_KEY'),
+        db_host=env.get('DB_HOST', 'localhost'),
+        db_port=int(env.get('DB_PORT', 5432)),
+        db_name=env.get('DB_NAME', 'bihar'),
+        db_user=env.get('DB_USER', 'postgres'),
+        db_password=env.get('DB_PASSWORD'),
+        semantic_cache_threshold=float(env.get('SEMANTIC_CACHE_THRESHOLD', 0.85)),
+        direct_answer_threshold=float(env.get('DIRECT_ANSWER_THRESHOLD', 0.92)),
+        web_concurrency=int(env.get('WEB_CONCURRENCY', 4)),
+        dev_mode=bool(env.get('DEV')),
+        redis_url=env.get('REDIS_URL'),
+        pdf_root=env.get('PDF_ROOT'),
+    )
+
+_cfg = get_config()
+DB_STATEMENT_TIMEOUT_MS = 60000  # Server-side cap per statement
+GOOGLE_API_KEY = _cfg.google_api_key
 DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': int(os.getenv('DB_PORT', 5432)),
-    'database': os.getenv('DB_NAME', 'bihar'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD'),
+    'host': _cfg.db_host,
+    'port': _cfg.db_port,
+    'database': _cfg.db_name,
+    'user': _cfg.db_user,
+    'password': _cfg.db_password,
     'connect_timeout': 30,
-    'application_name': 'bihar_rag_system'
+    'application_name': 'bihar_rag_system',
+    'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+}
+
+# Connection pool sizing (psycopg2 ThreadedConnectionPool arguments)
+DB_POOL_CONFIG = {
+    'minconn': 5,   # Opened at startup and kept idle between requests
+    'maxconn': 20
 }
 
+# HNSW vector index parameters (pgvector >= 0.5)
+HNSW_M = 16                 # Graph links per node
+HNSW_EF_CONSTRUCTION = 64   # Candidate list size while building
+HNSW_EF_SEARCH = 80         # Candidate list size per query; must exceed the LIMIT
+BINARY_RERANK_FACTOR = 10   # Binary-quantized candidates fetched per result before exact re-rank
+
+# Server-side PREPARE the hot search/insert statements once per connection
+DB_PREPARED_STATEMENTS = True
+
 # Configure Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
 EMBEDDING_MODEL = 'models/text-embedding-004'
-CHAT_MODEL = genai.GenerativeModel('gemini-2.5-flash-lite')
+CHAT_MODEL_NAME = 'gemini-2.5-flash-lite'
+
+@functools.lru_cache(maxsize=1)
+def configure_genai() -> None:
+    """Configure the Gemini SDK once, on the first API call rather than at import"""
+    genai.configure(api_key=GOOGLE_API_KEY)
+
+@functools.lru_cache(maxsize=1)
+def get_genai_client():
+    """The SDK's shared generative client; its gRPC channel carries every embed and chat call"""
+    configure_genai()
+    return genai_client.get_default_generative_client()
+
+@functools.lru_cache(maxsize=1)
+def get_chat_model() -> genai.GenerativeModel:
+    """Create the Gemini chat model on first use and reuse it afterwards"""
+    configure_genai()
+    # A fixed system instruction keeps the request prefix identical across queries
+    return genai.GenerativeModel(CHAT_MODEL_NAME, system_instruction=ENHANCED_SYSTEM_PROMPT)
 
 # System Prompt for Bihar ul Anwar (unchanged - it's working well)
 SYSTEM_PROMPT = """You are an expert scholar of Bihar ul Anwar, the comprehensive collection of Shia hadith compiled by Allama Muhammad Baqir Majlisi. 
@@ -48,18 +125,124 @@ When answering:
 
 Remember: Users are seeking authentic knowledge from Bihar ul Anwar, so accuracy in referencing is crucial."""
 
+# Answer-generation prompt, set once as the chat model's system instruction
+ENHANCED_SYSTEM_PROMPT = """You are a specialist in Bihar ul Anwar, the 110-volume hadith collection by Allama Muhammad Baqir Majlisi. You MUST follow these strict rules:
+
+CONTENT RULES:
+1. Use ONLY the provided excerpts from Bihar ul Anwar - NO external knowledge
+2. If the excerpts don't contain enough information, say "The provided excerpts are insufficient"
+3. NEVER add general Islamic knowledge not found in the excerpts
+4. Focus ONLY on actual hadith/traditions, NOT table of contents or indexes
+
+REFERENCE RULES:
+1. ALWAYS cite sources as: "Bihar ul Anwar, Volume X, Chapter Y, Hadith Z"
+2. If hadith number is missing, use: "Bihar ul Anwar, Volume X, Chapter Y"
+3. If chapter is missing, use: "Bihar ul Anwar, Volume X"
+4. NEVER include long quotes - only give clean references
+
+RESPONSE FORMAT:
+1. Start with a direct answer based ONLY on provided content
+2. List specific references at the end
+3. If asking about a chapter summary, extract ONLY key points from that chapter
+4. Do NOT elaborate beyond what's in the excerpts
+
+FORBIDDEN:
+- General Islamic explanations not in the text
+- Interpretations beyond the provided content  
+- Long quotations in responses
+- References to sources other than Bihar ul Anwar
+- Table of contents or index information as hadith content"""
+
 # ===================== OPTIMIZED PROCESSING CONFIGURATION =====================
 # Reduced limits for better performance and reliability
 MAX_PAGES_PER_VOLUME = 100    # Reduced from 200
 CHUNK_SIZE = 600              # Reduced from 800
 CHUNK_OVERLAP = 80            # Reduced from 100
-EMBEDDING_BATCH_SIZE = 2      # Reduced from 3
-DB_BATCH_SIZE = 25            # Reduced from 50
+EMBEDDING_BATCH_SIZE = 100    # Texts per embed_content request (API maximum)
+DB_BATCH_SIZE = 500           # Rows per multi-row INSERT statement and commit
+DB_COPY_THRESHOLD = 500       # Bulk loads at least this large use COPY instead of INSERT;
+                              # ingestion buffers embedded chunks up to this size
+DB_INSERT_METHOD = 'values'   # 'values' (execute_values) or 'unnest' (one array per column)
+PDF_ROOT = _cfg.pdf_root          # When set, /process-volume only reads PDFs under this directory
+PDF_PAGES_PER_BATCH = 3       # Pages joined before splitting into chunks
+PDF_PAGES_PER_SHARD = 12      # Pages per extraction task; a multiple of PDF_PAGES_PER_BATCH
+PDF_EXTRACT_WORKERS = min(os.cpu_count() or 1, 8)  # Processes for page extraction, capped to bound RAM
+
+@dataclass
+class AdaptiveBatch:
+    """Batch size that grows while P95 latency is under target and halves when over it"""
+    current: int
+    min_size: int
+    max_size: int
+    target_p95_ms: float
+    window: int = 50
+    _latencies: deque = field(default_factory=deque, init=False, repr=False)
+
+    def p95(self) -> float:
+        """P95 of the recorded batch latencies in milliseconds"""
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+    def record(self, latency_ms: float) -> int:
+        """Record one batch latency and return the adjusted batch size"""
+        self._latencies.append(latency_ms)
+        if len(self._latencies) > self.window:
+            self._latencies.popleft()
+        
+        p95 = self.p95()
+        if p95 > self.target_p95_ms:
+            self.current = max(self.min_size, self.current // 2)
+            self._latencies.clear()  # Judge the new size on fresh samples
+        elif p95 < 0.6 * self.target_p95_ms:
+            self.current = min(self.max_size, self.current + 2)
+        return self.current
+
+# Embedding batch size adapted to observed API latency
+EMBEDDING_BATCH = AdaptiveBatch(current=8, min_size=1, max_size=EMBEDDING_BATCH_SIZE, target_p95_ms=1500)
+
+# Server processes; DEV=1 runs a single auto-reloading process instead
+WEB_CONCURRENCY = _cfg.web_concurrency
+DEV_MODE = _cfg.dev_mode
+
+# Worker threads for blocking calls made from the async API handlers
+API_THREADPOOL_SIZE = 64
+
+# Responses at least this many bytes are gzip-compressed for clients that accept it
+GZIP_MINIMUM_SIZE = 1024
+
+# Dynamic batching of concurrent single-text embedding calls
+EMBEDDING_DYNAMIC_BATCH_MAX = 64   # Max texts coalesced into one API request
+EMBEDDING_BATCH_TIMEOUT_MS = 50    # Max wait for more texts before sending
+EMBEDDING_API_MAX_BATCH = EMBEDDING_BATCH_SIZE  # Texts accepted by one embed_content request
+EMBEDDING_CONCURRENCY = 4          # Embedding requests in flight while ingesting a volume
+
+# Caches for repeated queries; set REDIS_URL to share the exact-match and
+# embedding caches across server workers. Redis ignores the *_CACHE_SIZE limits,
+# so the server needs maxmemory set with maxmemory-policy allkeys-lru: under the
+# default noeviction, writes start failing once memory is full
+REDIS_URL = _cfg.redis_url
+QUERY_EMBEDDING_CACHE_SIZE = 50000 # Query embeddings kept in-process (LRU, 1.5 KB each)
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Query embedding lifetime
+SEARCH_CACHE_SIZE = 1024           # Search result lists kept (LRU)
+DATA_VERSION_CHECK_SECONDS = 30    # How often cached results are checked against processed_volumes
+RESPONSE_CACHE_SIZE = 10000        # Exact-match /query responses kept
+RESPONSE_CACHE_TTL_SECONDS = 3600  # Exact-match response lifetime
+SEMANTIC_CACHE_THRESHOLD = _cfg.semantic_cache_threshold  # Min cosine similarity to reuse a response
+SEMANTIC_CACHE_SIZE = 2048         # Responses kept for paraphrase matching
+SEMANTIC_CACHE_TTL_SECONDS = 7200  # Response lifetime in the semantic cache
+METADATA_CACHE_TTL_SECONDS = 30    # Lifetime of cached /volumes and /statistics data
+
+# top_k=1 queries whose match is at least this similar return its text without generation
+DIRECT_ANSWER_THRESHOLD = _cfg.direct_answer_threshold
 
 # Rate limiting to avoid API timeouts
 API_RATE_LIMIT_DELAY = 0.5    # 500ms between API calls
 BATCH_PROCESSING_DELAY = 3    # 3 seconds between batches
 RETRY_DELAY = 10              # 10 seconds between retries
+EMBEDDING_MAX_RETRIES = 5     # Retries of a rate-limited (429) embedding request
+EMBEDDING_BACKOFF_SECONDS = 2 # First backoff delay; doubles on each retry
 
 # Memory management
 MAX_CHUNK_LENGTH = 4000       # Maximum characters per chunk for embedding
@@ -81,10 +264,9 @@ MIN_CHUNK_LENGTH = 100           # Minimum characters for a valid chunk
 MIN_ARABIC_RATIO = 0.1          # Minimum ratio of Arabic text to consider bilingual
 MAX_EMPTY_CHUNKS_RATIO = 0.3    # Maximum ratio of empty chunks before stopping
 
-print("🔧 Optimized configuration loaded:")
-print(f"   📄 Max pages per volume: {MAX_PAGES_PER_VOLUME}")
-print(f"   📝 Chunk size: {CHUNK_SIZE}")
-print(f"   ⚡ Embedding batch size: {EMBEDDING_BATCH_SIZE}")
-print(f"   🗄️ DB batch size: {DB_BATCH_SIZE}")
-print(f"   ⏱️ API timeout: {API_TIMEOUT}s")
-print(f"   🔄 Processing timeout: {PROCESSING_TIMEOUT}s")
\ No newline at end of file
+log.info(
+    "Optimized configuration loaded: max_pages=%d chunk_size=%d embedding_batch=%d "
+    "db_batch=%d api_timeout=%ds processing_timeout=%ds",
+    MAX_PAGES_PER_VOLUME, CHUNK_SIZE, EMBEDDING_BATCH_SIZE,
+    DB_BATCH_SIZE, API_TIMEOUT, PROCESSING_TIMEOUT
+)
@@ -1,14 +1,96 @@
 # database.py - Complete database functions with enhancements
+import io
+import json
+import logging
+import numpy as np
 import psycopg2
 import re
-from psycopg2.extras import RealDictCursor, Json
+import struct
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from pgvector.psycopg2 import register_vector
-from typing import List, Dict, Optional
-from config import DB_CONFIG
+from typing import Callable, List, Dict, Optional
+from config import (
+    DB_CONFIG, DB_POOL_CONFIG, DB_BATCH_SIZE, DB_COPY_THRESHOLD, DB_INSERT_METHOD,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, BINARY_RERANK_FACTOR,
+    DB_PREPARED_STATEMENTS, SEARCH_CACHE_SIZE, DATA_VERSION_CHECK_SECONDS
+)
+
+log = logging.getLogger(__name__)
+
+__all__ = [
+    'get_conn', 'db_cursor', 'get_db_connection', 'close_db_connection', 'execute_prepared', 'halfvec_literal',
+    'init_database', 'migrate_database', 'copy_insert_chunks', 'verify_copy_encoding', 'batch_insert_chunks', 'record_processed_volume',
+    'search_similar_chunks_relaxed', 'search_similar_chunks', 'search_by_reference_relaxed',
+    'check_data_version', 'on_data_change', 'get_cached_search', 'cache_search', 'search_cache_stats', 'get_database_stats', 'get_processed_volumes',
+    'analyze_volume_metadata', 'reindex_vector_indexes'
+]
 
 # Database connection pool
+pool: Optional[ThreadedConnectionPool] = None
+_vector_registered = weakref.WeakSet()
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_CONFIG['maxconn'])
+
+# Single connection for standalone scripts
 db_conn = None
 
+def make_pool() -> ThreadedConnectionPool:
+    """Create a thread-safe connection pool from DB_CONFIG and DB_POOL_CONFIG"""
+    return ThreadedConnectionPool(**DB_POOL_CONFIG, **DB_CONFIG)
+
+def get_pool() -> ThreadedConnectionPool:
+    """Get or create the process-wide connection pool"""
+    global pool
+    with _pool_lock:
+        if pool is None or pool.closed:
+            pool = make_pool()
+        return pool
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; broken connections are retired, not returned"""
+    # Wait for a free connection rather than letting getconn() raise at maxconn
+    _pool_slots.acquire()
+    try:
+        conn_pool = get_pool()
+        conn = conn_pool.getconn()
+        retire = False
+        try:
+            if conn not in _vector_registered:
+                register_vector(conn)
+                # register_vector's type lookup opens a transaction; hand the connection
+                # out idle so callers can still switch it to autocommit
+                conn.commit()
+                _vector_registered.add(conn)
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            retire = True
+            raise
+        finally:
+            conn_pool.putconn(conn, close=retire or bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def db_cursor(cursor_factory=None):
+    """Cursor on a pooled connection; commits on success, rolls back on error"""
+    with get_conn() as conn:
+        cursor = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
 def get_db_connection():
     """Get or create database connection"""
     global db_conn
@@ -17,418 +99,846 @@ def get_db_connection():
         register_vector(db_conn)
     return db_conn
 
-def init_database():
-    """Initialize database tables with proper error handling"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Recent search results, dropped whenever processed_volumes changes
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+_data_version = None
+_data_version_checked = 0.0
+# Callbacks clearing other per-process caches when another worker loads a volume
+_data_change_listeners: List[Callable[[], None]] = []
+
+def on_data_change(callback: Callable[[], None]):
+    """Call callback whenever processed_volumes is seen to change"""
+    _data_change_listeners.append(callback)
+
+def _invalidate_search_cache():
+    """Forget cached search results after a local write"""
+    global _data_version_checked
+    with _search_cache_lock:
+        _search_cache.clear()
+        _data_version_checked = 0.0
+
+def _check_data_version():
+    """Clear the search cache if processed_volumes changed; queried at most every DATA_VERSION_CHECK_SECONDS"""
+    global _data_version, _data_version_checked
+    now = time.monotonic()
+    if now - _data_version_checked < DATA_VERSION_CHECK_SECONDS:
+        return
     
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(processed_at), COUNT(*) FROM processed_volumes")
+        version = cursor.fetchone()
+        cursor.close()
+    
+    with _search_cache_lock:
+        changed = _data_version is not None and version != _data_version
+        if version != _data_version:
+            _search_cache.clear()
+            _data_version = version
+        _data_version_checked = now
+    
+    if changed:
+        for callback in _data_change_listeners:
+            callback()
+
+def check_data_version() -> bool:
+    """Drop cached data if processed_volumes changed; False when the check itself failed"""
     try:
-        # Create pgvector extension
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
-        
-        # Create main table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bihar_chunks (
-                id SERIAL PRIMARY KEY,
-                volume_number INTEGER NOT NULL,
-                chapter_name VARCHAR(500),
-                hadith_number VARCHAR(100),
-                arabic_text TEXT,
-                english_text TEXT,
-                full_text TEXT NOT NULL,
-                chunk_index INTEGER,
-                embedding vector(768),
-                metadata JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create indexes separately
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_bihar_volume 
-            ON bihar_chunks (volume_number)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_bihar_hadith 
-            ON bihar_chunks (hadith_number)
-        """)
-        
-        # Vector index (create only if table has data)
-        cursor.execute("SELECT COUNT(*) FROM bihar_chunks")
-        count = cursor.fetchone()[0]
+        _check_data_version()
+        return True
+    except psycopg2.Error as e:
+        log.warning("⚠️ Search cache check failed: %s", e)
+        return False
+
+def get_cached_search(key: tuple) -> Optional[List[Dict]]:
+    """Return cached results for (normalized query, top_k, volume_filter), or None"""
+    if not check_data_version():
+        return None
+    
+    with _search_cache_lock:
+        results = _search_cache.get(key)
+        if results is not None:
+            _search_cache.move_to_end(key)
+        return results
+
+def cache_search(key: tuple, results: List[Dict]):
+    """Remember non-empty search results, evicting the least recently used"""
+    if not results:
+        return
+    with _search_cache_lock:
+        _search_cache[key] = results
+        _search_cache.move_to_end(key)
+        if len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+def search_cache_stats() -> Dict[str, int]:
+    """Number of cached search result lists"""
+    with _search_cache_lock:
+        return {'size': len(_search_cache)}
+
+# Names of the statements already PREPAREd on each connection
+_prepared = weakref.WeakKeyDictionary()
+_PARAM_RE = re.compile(r'\$(\d+)')
+
+def execute_prepared(cursor, name: str, arg_types: str, query: str, params: list):
+    """Run a $n-parameterized query via PREPARE once per connection, then EXECUTE"""
+    if not DB_PREPARED_STATEMENTS:
+        types = [t.strip() for t in arg_types.split(',')]
+        inline = _PARAM_RE.sub(lambda m: f"%(p{m[1]})s::{types[int(m[1]) - 1]}", query.replace('%', '%%'))
+        cursor.execute(inline, {f'p{i}': value for i, value in enumerate(params, 1)})
+        return
+    
+    prepared = _prepared.setdefault(cursor.connection, set())
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} ({arg_types}) AS {query}")
+        prepared.add(name)
+    cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+# Content quality computed once at write time for search filtering and ranking:
+# 0 = navigation page, 1 = other text, 2 = hadith content
+_QUALITY_SCORE_COLUMN = """
+    quality_score SMALLINT GENERATED ALWAYS AS (
+        CASE
+            -- Table of contents entries
+            WHEN (lower(full_text) LIKE '%table of contents%' AND length(btrim(full_text)) < 200)
+            -- Pure index pages
+            OR (lower(btrim(full_text)) LIKE 'overall%' AND lower(full_text) LIKE '%index%' AND length(btrim(full_text)) < 150)
+            -- Very short page headers
+            OR (length(btrim(full_text)) < 80 AND full_text ILIKE '%bihar al-anwaar%')
+            -- Chapter titles without content (short)
+            OR (lower(btrim(full_text)) LIKE 'chapter%' AND length(btrim(full_text)) < 120)
+            THEN 0
+            WHEN COALESCE(english_text ~* '\\y(said|narrated|reported|tradition|hadith)\\y', false)
+            OR COALESCE(arabic_text LIKE '%قال%' OR arabic_text LIKE '%عن%', false)
+            OR hadith_number IS NOT NULL
+            THEN 2
+            ELSE 1
+        END
+    ) STORED
+"""
+
+# Searchable-length flag so the length predicate is read from the heap row, not TOAST
+_HAS_CONTENT_COLUMN = """
+    has_content BOOLEAN GENERATED ALWAYS AS (
+        LENGTH(COALESCE(english_text, full_text, '')) > 100
+    ) STORED
+"""
+
+def _create_vector_indexes(cursor):
+    """Global HNSW indexes on embedding_h; no-ops once they exist"""
+    # HNSW needs no training data, so it can exist from the start. Stored vectors are
+    # unit length, so inner-product order is cosine order and each graph step skips
+    # the two norm computations
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_bihar_embedding_h_ip 
+        ON bihar_chunks 
+        USING hnsw (embedding_h halfvec_ip_ops) 
+        WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+    """)
+    
+    # Binary-quantized index (96 bytes/vector) for the first search stage
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_bihar_embedding_h_bq 
+        ON bihar_chunks 
+        USING hnsw ((binary_quantize(embedding_h)::bit(768)) bit_hamming_ops) 
+        WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+    """)
+
+def init_database():
+    """Create missing tables and indexes; schema changes to existing tables live in migrate_database()"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
         
-        if count > 100:
+        try:
+            # Index builds on a full table can outlast the per-statement timeout
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            
+            # Create pgvector extension
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            
+            # Create main table
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS bihar_chunks (
+                    id SERIAL PRIMARY KEY,
+                    volume_number INTEGER NOT NULL,
+                    chapter_name VARCHAR(500),
+                    hadith_number VARCHAR(100),
+                    arabic_text TEXT,
+                    english_text TEXT,
+                    full_text TEXT NOT NULL,
+                    chunk_index INTEGER,
+                    embedding_h halfvec(768),
+                    metadata JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    {_QUALITY_SCORE_COLUMN},
+                    {_HAS_CONTENT_COLUMN}
+                )
+            """)
+            
+            # ALTER TABLE takes an ACCESS EXCLUSIVE lock even when it changes nothing, so
+            # tables from older releases are upgraded by migrate.py, never at startup
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_bihar_embedding 
-                ON bihar_chunks 
-                USING ivfflat (embedding vector_cosine_ops) 
-                WITH (lists = 100)
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'bihar_chunks'
             """)
-        
-        # Processed volumes table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS processed_volumes (
-                id SERIAL PRIMARY KEY,
-                volume_number INTEGER UNIQUE,
-                file_name VARCHAR(255),
-                total_chunks INTEGER,
-                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            columns = {row[0] for row in cursor.fetchall()}
+            if 'embedding' in columns or not {'embedding_h', 'quality_score', 'has_content'} <= columns:
+                log.warning("⚠️ bihar_chunks predates the current schema; run migrate.py")
+            
+            # Create indexes separately
+            # Exact /search-by-reference matches seek on (volume, chapter, hadith); the
+            # leading column also serves volume-only filters
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bihar_vol_ch_h 
+                ON bihar_chunks (volume_number, chapter_name, hadith_number)
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bihar_hadith 
+                ON bihar_chunks (hadith_number)
+            """)
+            
+            # Embeddings are stored FP16 only (1.5 KB instead of 3 KB per row, pgvector >= 0.7)
+            if 'embedding_h' in columns:
+                _create_vector_indexes(cursor)
+            
+            # Processed volumes table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS processed_volumes (
+                    id SERIAL PRIMARY KEY,
+                    volume_number INTEGER UNIQUE,
+                    file_name VARCHAR(255),
+                    total_chunks INTEGER,
+                    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            conn.commit()
+            log.info("✅ Database initialized successfully")
+            
+        except Exception as e:
+            conn.rollback()
+            log.error("❌ Database initialization error: %s", e)
+            raise
+        finally:
+            cursor.close()
+
+def _migrate_halfvec(cursor):
+    """Backfill unit-length embedding_h from the FP32 embedding column, then drop that column"""
+    cursor.execute("ALTER TABLE bihar_chunks ADD COLUMN IF NOT EXISTS embedding_h halfvec(768)")
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'bihar_chunks' AND column_name = 'embedding'
+    """)
+    if cursor.fetchone():
+        _backfill_halfvec(cursor)
+    # init_database() skips these while embedding_h is missing
+    _create_vector_indexes(cursor)
+
+def _backfill_halfvec(cursor):
+    """Copy normalized FP32 embeddings into embedding_h"""
+    # Search ranks by inner product, which needs unit-length vectors, so rows are
+    # normalized in the same rewrite. Zero vectors come from failed embedding calls;
+    # as NULL they stay out of the HNSW graphs. New rows are normalized by
+    # generate_embeddings before insert
+    cursor.execute("""
+        UPDATE bihar_chunks 
+        SET embedding_h = CASE 
+            WHEN l2_norm(embedding) = 0 THEN NULL 
+            ELSE l2_normalize(embedding)::halfvec(768) 
+        END 
+        WHERE embedding_h IS NULL AND embedding IS NOT NULL
+    """)
+    # Its FP32 indexes are dropped along with it
+    cursor.execute("ALTER TABLE bihar_chunks DROP COLUMN embedding")
+
+def _migrate_volume_indexes(cursor):
+    """One partial binary-quantized HNSW graph per volume"""
+    # Volume-filtered searches walk only that volume instead of post-filtering a
+    # scan of the whole collection
+    for volume in range(1, 111):
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_bihar_embedding_h_bq_vol{volume} 
+            ON bihar_chunks 
+            USING hnsw ((binary_quantize(embedding_h)::bit(768)) bit_hamming_ops) 
+            WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+            WHERE volume_number = {volume}
         """)
-        
-        conn.commit()
-        print("✅ Database initialized successfully")
-        
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ Database initialization error: {e}")
-        raise
-    finally:
-        cursor.close()
 
-def batch_insert_chunks(chunks_data: List[Dict], batch_size: int = 50):
-    """Optimized batch insertion"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        total_chunks = len(chunks_data)
-        print(f"Inserting {total_chunks} chunks in batches of {batch_size}")
+def _migrate_drop_unused_indexes(cursor):
+    """Drop indexes that no search plan can use"""
+    # Chapter and hadith numbers are short digit strings; ILIKE '%12%' has no trigrams,
+    # so the GIN indexes were never used, and the reference lookup is bounded by the
+    # volume_number prefix of idx_bihar_vol_ch_h instead. has_content is only ever
+    # filtered alongside an HNSW scan, so its partial index was unused as well
+    cursor.execute("DROP INDEX IF EXISTS idx_bihar_chapter_trgm")
+    cursor.execute("DROP INDEX IF EXISTS idx_bihar_hadith_trgm")
+    cursor.execute("DROP INDEX IF EXISTS idx_bihar_has_content")
+
+# One-off data and index migrations: (version, description, step). Each runs once, in
+# its own transaction, and is recorded in schema_migrations
+def _migrate_generated_columns(cursor):
+    """Add the generated filter columns to tables created before them"""
+    # Both rewrite the whole table under an ACCESS EXCLUSIVE lock; new tables get
+    # them from CREATE TABLE in init_database()
+    cursor.execute(f"ALTER TABLE bihar_chunks ADD COLUMN IF NOT EXISTS {_QUALITY_SCORE_COLUMN}")
+    cursor.execute(f"ALTER TABLE bihar_chunks ADD COLUMN IF NOT EXISTS {_HAS_CONTENT_COLUMN}")
+    cursor.execute("ALTER TABLE bihar_chunks DROP COLUMN IF EXISTS has_hadith_marker")
+    # Superseded by idx_bihar_vol_ch_h and by the inner-product graph
+    cursor.execute("DROP INDEX IF EXISTS idx_bihar_volume")
+    cursor.execute("DROP INDEX IF EXISTS idx_bihar_embedding_h_hnsw")
+
+_MIGRATIONS = [
+    (1, "FP16 unit-length embeddings: backfill embedding_h and drop the FP32 column", _migrate_halfvec),
+    (2, "Per-volume binary-quantized HNSW indexes", _migrate_volume_indexes),
+    (3, "Drop unused trigram and has_content indexes", _migrate_drop_unused_indexes),
+    (4, "Generated quality_score and has_content columns; drop superseded indexes", _migrate_generated_columns),
+]
+
+def migrate_database() -> List[int]:
+    """Apply pending one-off migrations (run via migrate.py, not at startup); returns the versions applied"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
         
-        inserted_count = 0
-        for i in range(0, total_chunks, batch_size):
-            batch = chunks_data[i:i + batch_size]
-            
-            for chunk in batch:
-                cursor.execute("""
-                    INSERT INTO bihar_chunks 
-                    (volume_number, chapter_name, hadith_number, arabic_text, 
-                     english_text, full_text, chunk_index, embedding, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    chunk['volume_number'],
-                    chunk['metadata'].get('chapter'),
-                    chunk['metadata'].get('hadith_number'),
-                    chunk['arabic_text'],
-                    chunk['english_text'],
-                    chunk['full_text'],
-                    chunk['chunk_index'],
-                    chunk['embedding'],
-                    Json(chunk['metadata'])
-                ))
-                inserted_count += 1
-            
-            # Commit each batch
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
             conn.commit()
-            print(f"  Inserted batch: {inserted_count}/{total_chunks}")
-        
-        return inserted_count
-        
-    except Exception as e:
-        conn.rollback()
-        print(f"Batch insert error: {e}")
-        raise
-    finally:
-        cursor.close()
+            
+            applied = []
+            for version, description, step in _MIGRATIONS:
+                if version in done:
+                    continue
+                log.info("🔧 Migration %d: %s", version, description)
+                # Full-table rewrites and index builds outlast the per-statement timeout
+                cursor.execute("SET LOCAL statement_timeout = 0")
+                step(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+            
+            return applied
+            
+        except Exception as e:
+            conn.rollback()
+            log.error("❌ Migration error: %s", e)
+            raise
+        finally:
+            cursor.close()
 
-def search_similar_chunks_relaxed(query_embedding: List[float], top_k: int = 7, volume_filter: Optional[int] = None) -> List[Dict]:
-    """IMPROVED: Vector search with smart content filtering"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
-        # Check if embedding is valid
-        if not query_embedding or all(x == 0.0 for x in query_embedding):
-            print("❌ Invalid query embedding")
-            return []
-        
-        # Query with reasonable similarity threshold
-        base_query = """
-            SELECT 
-                volume_number,
-                chapter_name,
-                hadith_number,
-                arabic_text,
-                english_text,
-                full_text,
-                metadata,
-                1 - (embedding <=> %s::vector) as similarity
-            FROM bihar_chunks
-            WHERE embedding IS NOT NULL
-            AND LENGTH(COALESCE(english_text, full_text, '')) > 100
-        """
-        
-        params = [query_embedding]
-        
-        # Add volume filter
-        if volume_filter:
-            base_query += " AND volume_number = %s"
-            params.append(volume_filter)
-        
-        # Reasonable similarity threshold
-        base_query += """
-            AND 1 - (embedding <=> %s::vector) > 0.3
-            ORDER BY embedding <=> %s::vector
-            LIMIT %s
-        """
-        
-        params.extend([query_embedding, query_embedding, top_k * 3])  # Get more to filter
-        
-        cursor.execute(base_query, params)
-        raw_results = cursor.fetchall()
-        
-        print(f"🔍 Found {len(raw_results)} raw results")
-        
-        # IMPROVED: Smart filtering that keeps actual content
-        filtered_results = []
-        for result in raw_results:
-            full_text = result['full_text'].lower().strip()
-            english_text = result.get('english_text', '').lower()
-            
-            # Skip obvious non-content
-            should_exclude = (
-                # Table of contents entries
-                ('table of contents' in full_text and len(full_text) < 200)
-                or
-                # Pure index pages
-                (full_text.startswith('overall') and 'index' in full_text and len(full_text) < 150)
-                or
-                # Very short page headers
-                (len(full_text) < 80 and 'bihar al-anwaar' in full_text)
-                or
-                # Chapter titles without content (short)
-                (full_text.startswith('chapter') and len(full_text) < 120)
-            )
-            
-            # Prefer content with hadith indicators
-            has_hadith_content = any([
-                'said' in english_text,
-                'narrated' in english_text,
-                'reported' in english_text,
-                'tradition' in english_text,
-                'hadith' in english_text,
-                result.get('hadith_number') is not None,
-                'قال' in result.get('arabic_text', ''),
-                'عن' in result.get('arabic_text', ''),
-            ])
-            
-            if not should_exclude:
-                # Prioritize hadith content
-                result['content_priority'] = 1 if has_hadith_content else 0.5
-                filtered_results.append(result)
-        
-        # Sort by content priority and similarity
-        filtered_results.sort(key=lambda x: (x['content_priority'], x['similarity']), reverse=True)
-        
-        # Return top results
-        final_results = filtered_results[:top_k]
-        
-        print(f"🔍 Smart filtering: {len(final_results)} quality results from {len(raw_results)} raw results")
-        return final_results
-        
-    except Exception as e:
-        print(f"❌ Vector search error: {e}")
-        return []
-    finally:
-        cursor.close()
+# COPY binary format: signature, flags and header-extension length
+_COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+_COPY_BINARY_NULL = struct.pack('>i', -1)
 
-def get_database_stats():
-    """Get comprehensive database statistics"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    stats = {}
+def _copy_field(value: Optional[bytes]) -> bytes:
+    """One length-prefixed COPY binary field"""
+    if value is None:
+        return _COPY_BINARY_NULL
+    return struct.pack('>i', len(value)) + value
+
+def _copy_text(value) -> Optional[bytes]:
+    """text/varchar in binary format: the UTF-8 bytes themselves"""
+    return None if value is None else str(value).encode()
+
+def _halfvec_binary(embedding) -> Optional[bytes]:
+    """halfvec wire format (dim, unused, big-endian FP16 values), or None for an all-zero embedding"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    if not vector.any():
+        return None
+    return struct.pack('>HH', vector.size, 0) + vector.astype('>f2').tobytes()
+
+def halfvec_literal(embedding) -> str:
+    """Format an embedding as a halfvec text literal from float16 values"""
+    # Shortest round-tripping float16 digits; the server would round to FP16 anyway
+    return '[' + ','.join(map(str, np.asarray(embedding, dtype=np.float16))) + ']'
+
+def _stored_embedding(embedding) -> Optional[str]:
+    """halfvec literal to store for a chunk, or None (NULL) for a failed all-zero embedding"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    if not vector.any():
+        return None
+    return halfvec_literal(vector)
+
+def _copy_chunks(cursor, chunks_data: List[Dict]):
+    """Send chunks to bihar_chunks as one binary COPY, without committing"""
+    # Binary format: embeddings travel as 2 bytes per dimension and the
+    # server skips parsing 768 decimal floats per row
+    buffer = io.BytesIO()
+    buffer.write(_COPY_BINARY_HEADER)
+    row_header = struct.pack('>h', 9)
+    for chunk in chunks_data:
+        fields = (
+            struct.pack('>i', chunk['volume_number']),
+            _copy_text(chunk['metadata'].get('chapter')),
+            _copy_text(chunk['metadata'].get('hadith_number')),
+            _copy_text(chunk['arabic_text']),
+            _copy_text(chunk['english_text']),
+            _copy_text(chunk['full_text']),
+            struct.pack('>i', chunk['chunk_index']),
+            _halfvec_binary(chunk['embedding']),
+            b'\x01' + json.dumps(chunk['metadata']).encode()  # jsonb version 1
+        )
+        buffer.write(row_header)
+        buffer.write(b''.join(map(_copy_field, fields)))
+    buffer.write(struct.pack('>h', -1))
+    buffer.seek(0)
     
-    # Total statistics
-    cursor.execute("SELECT COUNT(DISTINCT volume_number) FROM bihar_chunks")
-    stats['total_volumes'] = cursor.fetchone()[0] or 0
+    cursor.copy_expert("""
+        COPY bihar_chunks 
+        (volume_number, chapter_name, hadith_number, arabic_text, 
+         english_text, full_text, chunk_index, embedding_h, metadata)
+        FROM STDIN WITH (FORMAT binary)
+    """, buffer)
+
+def copy_insert_chunks(chunks_data: List[Dict]) -> int:
+    """Bulk load chunks with COPY FROM STDIN in a single statement"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            log.info("Copying %d chunks with COPY", len(chunks_data))
+            _copy_chunks(cursor, chunks_data)
+            conn.commit()
+            _invalidate_search_cache()
+            
+            log.info("  Copied %d chunks", cursor.rowcount)
+            return cursor.rowcount
+            
+        except Exception as e:
+            conn.rollback()
+            log.error("COPY insert error: %s", e)
+            raise
+        finally:
+            cursor.close()
+
+def verify_copy_encoding() -> bool:
+    """Round-trip sample chunks through the binary COPY encoder into bihar_chunks, then roll back"""
+    rng = np.random.default_rng(0)
+    # Volume -1 never holds real chunks; the rows are never committed
+    samples = [
+        {
+            'volume_number': -1, 'chunk_index': 0,
+            'arabic_text': 'قال رسول الله', 'english_text': 'He said: "knowledge"\tis light \\ 100%',
+            'full_text': 'قال He said', 'embedding': rng.standard_normal(768).astype(np.float32),
+            'metadata': {'volume': -1, 'chapter': 'باب 1', 'hadith_number': '7', 'pages': [1, 2]}
+        },
+        {
+            'volume_number': -1, 'chunk_index': 1,
+            'arabic_text': '', 'english_text': None, 'full_text': 'x',
+            'embedding': np.zeros(768, dtype=np.float32),
+            'metadata': {'volume': -1, 'chapter': None, 'hadith_number': None}
+        }
+    ]
     
-    cursor.execute("SELECT COUNT(*) FROM bihar_chunks")
-    stats['total_chunks'] = cursor.fetchone()[0] or 0
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        try:
+            _copy_chunks(cursor, samples)
+            cursor.execute("""
+                SELECT chapter_name, hadith_number, arabic_text, english_text, 
+                       full_text, embedding_h::text, metadata
+                FROM bihar_chunks 
+                WHERE volume_number = -1 
+                ORDER BY chunk_index
+            """)
+            rows = cursor.fetchall()
+        finally:
+            conn.rollback()
+            cursor.close()
     
-    cursor.execute("SELECT COUNT(DISTINCT chapter_name) FROM bihar_chunks WHERE chapter_name IS NOT NULL")
-    stats['total_chapters'] = cursor.fetchone()[0] or 0
+    if len(rows) != len(samples):
+        log.error("❌ COPY round trip returned %d of %d rows", len(rows), len(samples))
+        return False
     
-    cursor.execute("SELECT COUNT(DISTINCT hadith_number) FROM bihar_chunks WHERE hadith_number IS NOT NULL")
-    stats['total_hadiths'] = cursor.fetchone()[0] or 0
+    ok = True
+    for chunk, (chapter, hadith, arabic, english, full, embedding, metadata) in zip(samples, rows):
+        expected = (
+            chunk['metadata'].get('chapter'), chunk['metadata'].get('hadith_number'),
+            chunk['arabic_text'], chunk['english_text'], chunk['full_text'], chunk['metadata']
+        )
+        if (chapter, hadith, arabic, english, full, metadata) != expected:
+            log.error("❌ COPY round trip changed chunk %d: %r", chunk['chunk_index'], (chapter, hadith, arabic, english, full, metadata))
+            ok = False
+        
+        # Stored values are the FP16 rounding of the input; all-zero embeddings become NULL
+        vector = chunk['embedding']
+        if not vector.any():
+            if embedding is not None:
+                log.error("❌ COPY round trip stored a zero embedding for chunk %d", chunk['chunk_index'])
+                ok = False
+        elif embedding is None or not np.array_equal(
+            np.array(json.loads(embedding), dtype=np.float32), vector.astype(np.float16).astype(np.float32)
+        ):
+            log.error("❌ COPY round trip changed the embedding of chunk %d", chunk['chunk_index'])
+            ok = False
     
-    # Language distribution
+    return ok
+
+def _unnest_insert(cursor, batch: List[Dict]):
+    """Insert a batch as one array per column expanded by UNNEST in a single statement"""
     cursor.execute("""
-        SELECT 
-            COUNT(CASE WHEN arabic_text != '' THEN 1 END) as with_arabic,
-            COUNT(CASE WHEN english_text != '' THEN 1 END) as with_english
-        FROM bihar_chunks
-    """)
-    lang_stats = cursor.fetchone()
-    stats['chunks_with_arabic'] = lang_stats[0] or 0
-    stats['chunks_with_english'] = lang_stats[1] or 0
+        INSERT INTO bihar_chunks 
+        (volume_number, chapter_name, hadith_number, arabic_text, 
+         english_text, full_text, chunk_index, embedding_h, metadata)
+        SELECT v, c, h, a, e, f, i, emb, m
+        FROM unnest(
+            %s::int[], %s::varchar[], %s::varchar[], %s::text[], %s::text[],
+            %s::text[], %s::int[], %s::halfvec(768)[], %s::jsonb[]
+        ) AS t(v, c, h, a, e, f, i, emb, m)
+    """, (
+        [chunk['volume_number'] for chunk in batch],
+        [chunk['metadata'].get('chapter') for chunk in batch],
+        [chunk['metadata'].get('hadith_number') for chunk in batch],
+        [chunk['arabic_text'] for chunk in batch],
+        [chunk['english_text'] for chunk in batch],
+        [chunk['full_text'] for chunk in batch],
+        [chunk['chunk_index'] for chunk in batch],
+        [_stored_embedding(chunk['embedding']) for chunk in batch],
+        [json.dumps(chunk['metadata']) for chunk in batch]
+    ))
+
+def batch_insert_chunks(chunks_data: List[Dict], batch_size: int = DB_BATCH_SIZE):
+    """Optimized batch insertion"""
+    if len(chunks_data) >= DB_COPY_THRESHOLD:
+        return copy_insert_chunks(chunks_data)
     
-    cursor.close()
-    return stats
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            total_chunks = len(chunks_data)
+            log.info("Inserting %d chunks in batches of %d", total_chunks, batch_size)
+            
+            inserted_count = 0
+            for i in range(0, total_chunks, batch_size):
+                batch = chunks_data[i:i + batch_size]
+                
+                if DB_INSERT_METHOD == 'unnest':
+                    _unnest_insert(cursor, batch)
+                else:
+                    rows = []
+                    for chunk in batch:
+                        rows.append((
+                            chunk['volume_number'],
+                            chunk['metadata'].get('chapter'),
+                            chunk['metadata'].get('hadith_number'),
+                            chunk['arabic_text'],
+                            chunk['english_text'],
+                            chunk['full_text'],
+                            chunk['chunk_index'],
+                            _stored_embedding(chunk['embedding']),
+                            Json(chunk['metadata'])
+                        ))
+                    
+                    # One multi-row INSERT per batch instead of one round trip per chunk
+                    execute_values(cursor, """
+                        INSERT INTO bihar_chunks 
+                        (volume_number, chapter_name, hadith_number, arabic_text, 
+                         english_text, full_text, chunk_index, embedding_h, metadata)
+                        VALUES %s
+                    """, rows, template="(%s, %s, %s, %s, %s, %s, %s, %s::halfvec(768), %s)", page_size=batch_size)
+                inserted_count += len(batch)
+                
+                # Commit each batch
+                conn.commit()
+                _invalidate_search_cache()
+                log.info("  Inserted batch: %d/%d", inserted_count, total_chunks)
+            
+            return inserted_count
+            
+        except Exception as e:
+            conn.rollback()
+            log.error("Batch insert error: %s", e)
+            raise
+        finally:
+            cursor.close()
+
+def search_similar_chunks_relaxed(query_embedding: List[float], top_k: int = 7, volume_filter: Optional[int] = None) -> List[Dict]:
+    """IMPROVED: Vector search with smart content filtering"""
+    with get_conn() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        try:
+            # Check if embedding is valid (one vectorized reduction)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            if query_vector.size == 0 or not norm:
+                log.error("❌ Invalid query embedding")
+                return []
+            query_vector = query_vector / norm
+            
+            # Hamming candidates are re-ranked with the FP16 vector
+            candidates = top_k * 3 * BINARY_RERANK_FACTOR
+            
+            # Candidate list size for the HNSW scan (reset at transaction end)
+            ef_search = min(max(HNSW_EF_SEARCH, candidates), 1000)
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef_search)])
+            
+            # A literal volume lets the planner match the partial index; a $n parameter
+            # in a generic prepared plan could not
+            volume_clause = f"AND volume_number = {int(volume_filter)}" if volume_filter else ""
+            
+            # Arabic text is only ever shown as an excerpt of at most 300 characters, so
+            # longer text is not sent, converted to str or held in the search cache.
+            # Query vector is sent and cast once, then shared through the CTE
+            # Stage 1: binary-quantized scan that skips navigation pages;
+            # stage 2: halfvec re-rank, hadith content first. Stored and query vectors are
+            # unit length, so the inner product is the cosine similarity without the two
+            # norms; it is computed once per candidate and reused by the threshold and the sort
+            base_query = f"""
+                WITH q AS (SELECT $1::halfvec(768) AS v)
+                SELECT 
+                    volume_number,
+                    chapter_name,
+                    hadith_number,
+                    left(arabic_text, 300) as arabic_text,
+                    english_text,
+                    full_text,
+                    metadata,
+                    score as similarity,
+                    CASE WHEN quality_score = 2 THEN 1 ELSE 0.5 END as content_priority
+                FROM (
+                    SELECT *, -(embedding_h <#> (SELECT v FROM q)) AS score
+                    FROM bihar_chunks
+                    WHERE embedding_h IS NOT NULL
+                    AND has_content
+                    AND quality_score > 0
+                    {volume_clause}
+                    ORDER BY binary_quantize(embedding_h)::bit(768) <~> binary_quantize((SELECT v FROM q))
+                    LIMIT $2
+                ) AS candidates
+                WHERE score > 0.3
+                ORDER BY quality_score DESC, score DESC
+                LIMIT $3
+            """
+            
+            # Sent as FP16, the precision of the stored embedding_h column
+            params = [halfvec_literal(query_vector), candidates, top_k]
+            name = f"search_relaxed_vol{int(volume_filter)}" if volume_filter else "search_relaxed"
+            execute_prepared(cursor, name, "halfvec(768), int, int", base_query, params)
+            final_results = cursor.fetchall()
+            
+            log.info("🔍 Smart filtering: %d quality results", len(final_results))
+            return final_results
+            
+        except Exception as e:
+            log.error("❌ Vector search error: %s", e)
+            return []
+        finally:
+            cursor.close()
+
+# Earlier name of the vector search, kept for older callers
+search_similar_chunks = search_similar_chunks_relaxed
+
+def get_database_stats():
+    """Get comprehensive database statistics"""
+    with db_cursor(RealDictCursor) as cursor:
+        # All aggregates in one scan and one round trip
+        cursor.execute("""
+            SELECT 
+                COUNT(DISTINCT volume_number) as total_volumes,
+                COUNT(*) as total_chunks,
+                COUNT(DISTINCT chapter_name) as total_chapters,
+                COUNT(DISTINCT hadith_number) as total_hadiths,
+                COUNT(*) FILTER (WHERE arabic_text <> '') as chunks_with_arabic,
+                COUNT(*) FILTER (WHERE english_text <> '') as chunks_with_english
+            FROM bihar_chunks
+        """)
+        return dict(cursor.fetchone())
 
 def get_processed_volumes():
     """Get list of processed volumes"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            volume_number,
-            COUNT(*) as chunk_count,
-            COUNT(DISTINCT chapter_name) as chapters,
-            MIN(created_at) as processed_date
-        FROM bihar_chunks
-        GROUP BY volume_number
-        ORDER BY volume_number
-    """)
-    
-    volumes = cursor.fetchall()
-    cursor.close()
-    
-    return volumes
-
-def search_by_reference_relaxed(volume: int, chapter: Optional[str] = None, hadith: Optional[str] = None):
-    """FIXED: Reference search with corrected SQL"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
-        print(f"🔍 Fixed search: Volume {volume}, Chapter {chapter}, Hadith {hadith}")
+    with get_conn() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Start with base query
-        base_query = """
+        cursor.execute("""
             SELECT 
                 volume_number,
-                chapter_name,
-                hadith_number,
-                arabic_text,
-                english_text,
-                LEFT(full_text, 300) as full_text,
-                metadata
-            FROM bihar_chunks 
-            WHERE volume_number = %s
-        """
-        params = [volume]
-        
-        # Add chapter filter if provided
-        if chapter and chapter.strip():
-            base_query += " AND (chapter_name = %s OR chapter_name ILIKE %s)"
-            params.append(chapter)
-            params.append(f'%{chapter}%')
-        
-        # Add hadith filter if provided  
-        if hadith and hadith.strip():
-            base_query += " AND (hadith_number = %s OR hadith_number ILIKE %s)"
-            params.append(hadith)
-            params.append(f'%{hadith}%')
-        
-        # Add basic length filter and ordering
-        base_query += """
-            AND LENGTH(COALESCE(english_text, full_text, '')) > 50
-            ORDER BY 
-                CASE WHEN hadith_number IS NOT NULL THEN 1 ELSE 2 END,
-                chunk_index 
-            LIMIT 20
-        """
-        
-        print(f"Executing query with {len(params)} parameters...")
-        print(f"Query: {base_query}")
-        print(f"Params: {params}")
-        
-        cursor.execute(base_query, params)
-        raw_results = cursor.fetchall()
-        
-        print(f"Raw results: {len(raw_results)}")
+                COUNT(*) as chunk_count,
+                COUNT(DISTINCT chapter_name) as chapters,
+                MIN(created_at) as processed_date
+            FROM bihar_chunks
+            GROUP BY volume_number
+            ORDER BY volume_number
+        """)
         
-        # Very minimal filtering - only exclude obvious non-content
-        filtered_results = []
-        for result in raw_results:
-            full_text = result['full_text'].lower().strip() if result['full_text'] else ""
-            
-            # Only exclude very obvious non-content
-            should_exclude = (
-                len(full_text) < 30  # Very short
-                or full_text.startswith('table of contents')  # Pure TOC
-                or (full_text.startswith('page ') and len(full_text) < 50)  # Page numbers only
-            )
-            
-            if not should_exclude:
-                filtered_results.append(result)
+        volumes = cursor.fetchall()
+        cursor.close()
         
-        print(f"✅ Found {len(filtered_results)} results after minimal filtering")
-        return filtered_results
+        return volumes
+
+def search_by_reference_relaxed(volume: int, chapter: Optional[str] = None, hadith: Optional[str] = None):
+    """FIXED: Reference search with corrected SQL"""
+    with get_conn() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-    except Exception as e:
-        print(f"❌ Fixed reference search error: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
-    finally:
-        cursor.close()
+        try:
+            log.info("🔍 Reference search: Volume %s, Chapter %s, Hadith %s", volume, chapter, hadith)
+            
+            # Empty chapter/hadith arguments disable their filter
+            base_query = """
+                SELECT 
+                    volume_number,
+                    chapter_name,
+                    hadith_number,
+                    arabic_text,
+                    english_text,
+                    substring(full_text for 300) as full_text,
+                    metadata
+                FROM bihar_chunks 
+                WHERE volume_number = $1
+                AND ($2::varchar IS NULL OR chapter_name = $2 OR chapter_name ILIKE '%' || $2 || '%')
+                AND ($3::varchar IS NULL OR hadith_number = $3 OR hadith_number ILIKE '%' || $3 || '%')
+                AND LENGTH(COALESCE(english_text, full_text, '')) > 50
+                ORDER BY 
+                    CASE WHEN hadith_number IS NOT NULL THEN 1 ELSE 2 END,
+                    chunk_index 
+                LIMIT 20
+            """
+            params = [
+                volume,
+                chapter if chapter and chapter.strip() else None,
+                hadith if hadith and hadith.strip() else None
+            ]
+            
+            log.debug("Reference search params: %s", params)
+            
+            execute_prepared(cursor, "search_by_reference", "int, varchar, varchar", base_query, params)
+            # Very minimal filtering - only exclude obvious non-content
+            raw_count = 0
+            filtered_results = []
+            for result in cursor:
+                raw_count += 1
+                full_text = result['full_text'].lower().strip() if result['full_text'] else ""
+                
+                # Only exclude very obvious non-content
+                should_exclude = (
+                    len(full_text) < 30  # Very short
+                    or full_text.startswith('table of contents')  # Pure TOC
+                    or (full_text.startswith('page ') and len(full_text) < 50)  # Page numbers only
+                )
+                
+                if not should_exclude:
+                    filtered_results.append(result)
+            
+            log.info("✅ Found %d of %d results after minimal filtering", len(filtered_results), raw_count)
+            return filtered_results
+            
+        except Exception as e:
+            log.exception("❌ Reference search error: %s", e)
+            return []
+        finally:
+            cursor.close()
 
 def record_processed_volume(volume_number: int, file_name: str, total_chunks: int):
     """Record a successfully processed volume"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO processed_volumes (volume_number, file_name, total_chunks)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (volume_number) 
-        DO UPDATE SET 
-            total_chunks = EXCLUDED.total_chunks,
-            processed_at = CURRENT_TIMESTAMP,
-            file_name = EXCLUDED.file_name
-    """, (volume_number, file_name, total_chunks))
-    
-    conn.commit()
-    cursor.close()
+    with db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO processed_volumes (volume_number, file_name, total_chunks)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (volume_number) 
+            DO UPDATE SET 
+                total_chunks = EXCLUDED.total_chunks,
+                processed_at = CURRENT_TIMESTAMP,
+                file_name = EXCLUDED.file_name
+        """, (volume_number, file_name, total_chunks))
+    _invalidate_search_cache()
+
+# pg_advisory_lock key held while the embedding indexes are rebuilt
+_REINDEX_LOCK_ID = 0x62696861
+
+def reindex_vector_indexes() -> List[str]:
+    """Rebuild the embedding indexes after bulk ingestion, without blocking searches"""
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        # REINDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        # Two concurrent rebuilds would each hold a second copy of every graph
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (_REINDEX_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            cursor.close()
+            conn.autocommit = False
+            raise RuntimeError("An index rebuild is already running")
+        try:
+            # Graph builds on a full table outlast the per-statement timeout
+            cursor.execute("SET statement_timeout = 0")
+            cursor.execute("SET maintenance_work_mem = '1GB'")
+            cursor.execute("""
+                SELECT indexname FROM pg_indexes
+                WHERE tablename = 'bihar_chunks' AND indexname LIKE 'idx_bihar_embedding_h_%'
+                ORDER BY indexname
+            """)
+            names = [row[0] for row in cursor.fetchall()]
+            
+            for name in names:
+                log.info("🔧 Rebuilding %s", name)
+                cursor.execute(f"REINDEX INDEX CONCURRENTLY {name}")
+            cursor.execute("ANALYZE bihar_chunks")
+            return names
+        finally:
+            cursor.execute("RESET statement_timeout")
+            cursor.execute("RESET maintenance_work_mem")
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (_REINDEX_LOCK_ID,))
+            cursor.close()
+            conn.autocommit = False
 
 def close_db_connection():
-    """Close database connection"""
+    """Close the connection pool and any script connection"""
     global db_conn
+    if pool is not None and not pool.closed:
+        pool.closeall()
     if db_conn and not db_conn.closed:
         db_conn.close()
-        print("Database connection closed")
+    log.info("Database connection closed")
 
 # Additional helper functions remain the same
 def analyze_volume_metadata(volume: int):
     """Analyze metadata structure for a volume"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
-        cursor.execute("""
-            SELECT 
-                chapter_name,
-                hadith_number,
-                metadata,
-                LEFT(full_text, 200) as text_sample
-            FROM bihar_chunks 
-            WHERE volume_number = %s 
-            ORDER BY chunk_index
-            LIMIT 10
-        """, [volume])
-        
-        results = cursor.fetchall()
-        
-        chapters_found = set()
-        hadiths_found = set()
-        
-        for row in results:
-            if row['chapter_name']:
-                chapters_found.add(row['chapter_name'])
-            if row['hadith_number']:
-                hadiths_found.add(row['hadith_number'])
+    with get_conn() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        return {
-            'chapters': list(chapters_found),
-            'hadiths': list(hadiths_found)
-        }
-        
-    except Exception as e:
-        print(f"❌ Error analyzing metadata: {e}")
-        return {}
-    finally:
-        cursor.close()
\ No newline at end of file
+        try:
+            cursor.execute("""
+                SELECT 
+                    chapter_name,
+                    hadith_number,
+                    metadata,
+                    LEFT(full_text, 200) as text_sample
+                FROM bihar_chunks 
+                WHERE volume_number = %s 
+                ORDER BY chunk_index
+                LIMIT 10
+            """, [volume])
+            
+            results = cursor.fetchall()
+            
+            chapters_found = set()
+            hadiths_found = set()
+            
+            for row in results:
+                if row['chapter_name']:
+                    chapters_found.add(row['chapter_name'])
+                if row['hadith_number']:
+                    hadiths_found.add(row['hadith_number'])
+            
+            return {
+                'chapters': list(chapters_found),
+                'hadiths': list(hadiths_found)
+            }
+            
+        except Exception as e:
+            log.error("❌ Error analyzing metadata: %s", e)
+            return {}
+        finally:
+            cursor.close()
\ No newline at end of file
@@ -1,13 +1,24 @@
 # debug_filtering.py - Debug the filtering issues
 import sys
 import os
+import re
+import numpy as np
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import get_db_connection
+from database import get_db_connection, halfvec_literal
 from processing import generate_query_embedding
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+# Reference-search exclusion patterns, one group each so a match names its pattern
+EXCLUDE_PATTERNS = [
+    'table of contents',
+    'overall index',
+    'bihar al-anwaar volume',
+    'page \\d+ of \\d+',
+]
+_EXCLUDE_RE = re.compile('|'.join(f'({pattern})' for pattern in EXCLUDE_PATTERNS), re.IGNORECASE)
+
 def debug_query_embedding():
     """Debug query embedding generation"""
     print("🔍 DEBUGGING QUERY EMBEDDING")
@@ -40,31 +51,61 @@ def debug_database_search(query_embedding):
     print("\n🔍 DEBUGGING DATABASE SEARCH")
     print("=" * 50)
     
-    if not query_embedding or all(x == 0.0 for x in query_embedding):
+    query_vector = np.asarray(query_embedding or [], dtype=np.float32)
+    norm = np.linalg.norm(query_vector)
+    if not norm:
         print("❌ Cannot test with invalid embedding")
         return
     
+    # Normalized and formatted once on the client
+    query_literal = halfvec_literal(query_vector / norm)
+    
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
-        # Test 1: Basic similarity search without filters
-        print("Test 1: Basic similarity search")
+        # Tests 1 and 2 share one statement, so the query vector crosses the wire once.
+        # Unit-length vectors make the negated inner product the cosine similarity; the
+        # top 5 walk the HNSW index and the distribution is one pass bucketed four ways
         cursor.execute("""
-            SELECT 
-                volume_number,
-                chapter_name,
-                hadith_number,
-                LEFT(english_text, 100) as text_preview,
-                1 - (embedding <=> %s::vector) as similarity
-            FROM bihar_chunks
-            WHERE embedding IS NOT NULL
-            AND volume_number = 1
-            ORDER BY embedding <=> %s::vector
-            LIMIT 5
-        """, [query_embedding, query_embedding])
+            WITH q AS (SELECT %s::halfvec(768) AS v),
+            top AS (
+                SELECT 
+                    volume_number,
+                    chapter_name,
+                    hadith_number,
+                    LEFT(english_text, 100) as text_preview,
+                    -(embedding_h <#> (SELECT v FROM q)) as similarity
+                FROM bihar_chunks
+                WHERE embedding_h IS NOT NULL
+                AND volume_number = 1
+                ORDER BY embedding_h <#> (SELECT v FROM q)
+                LIMIT 5
+            ),
+            sims AS (
+                SELECT -(embedding_h <#> (SELECT v FROM q)) as similarity
+                FROM bihar_chunks
+                WHERE embedding_h IS NOT NULL AND volume_number = 1
+            ),
+            stats AS (
+                SELECT 
+                    COUNT(*) as total,
+                    COUNT(*) FILTER (WHERE similarity > 0.5) as above_50,
+                    COUNT(*) FILTER (WHERE similarity > 0.3) as above_30,
+                    COUNT(*) FILTER (WHERE similarity > 0.25) as above_25,
+                    COUNT(*) FILTER (WHERE similarity > 0.2) as above_20
+                FROM sims
+            )
+            SELECT stats.*, top.*
+            FROM stats LEFT JOIN top ON true
+            ORDER BY top.similarity DESC NULLS LAST
+        """, [query_literal])
+        
+        rows = cursor.fetchall()
         
-        basic_results = cursor.fetchall()
+        # Test 1: Basic similarity search without filters
+        print("Test 1: Basic similarity search")
+        basic_results = [row for row in rows if row['volume_number'] is not None]
         print(f"   Found {len(basic_results)} results")
         
         for i, result in enumerate(basic_results, 1):
@@ -74,18 +115,7 @@ def debug_database_search(query_embedding):
         
         # Test 2: Check similarity thresholds
         print("\nTest 2: Similarity distribution")
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN 1 - (embedding <=> %s::vector) > 0.5 THEN 1 END) as above_50,
-                COUNT(CASE WHEN 1 - (embedding <=> %s::vector) > 0.3 THEN 1 END) as above_30,
-                COUNT(CASE WHEN 1 - (embedding <=> %s::vector) > 0.25 THEN 1 END) as above_25,
-                COUNT(CASE WHEN 1 - (embedding <=> %s::vector) > 0.2 THEN 1 END) as above_20
-            FROM bihar_chunks
-            WHERE embedding IS NOT NULL AND volume_number = 1
-        """, [query_embedding, query_embedding, query_embedding, query_embedding])
-        
-        threshold_stats = cursor.fetchone()
+        threshold_stats = rows[0]
         print(f"   Total chunks: {threshold_stats['total']}")
         print(f"   Above 0.5 similarity: {threshold_stats['above_50']}")
         print(f"   Above 0.3 similarity: {threshold_stats['above_30']}")
@@ -131,17 +161,14 @@ def debug_reference_search():
     print("=" * 50)
     
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    # Only the preview column is read, so a plain tuple cursor is enough
+    cursor = conn.cursor()
     
     try:
         # Test without any content filtering
         print("Test 1: Reference search without content filters")
         cursor.execute("""
-            SELECT 
-                volume_number,
-                chapter_name,
-                hadith_number,
-                LEFT(full_text, 150) as text_preview
+            SELECT LEFT(full_text, 150) as text_preview
             FROM bihar_chunks 
             WHERE volume_number = 1 AND chapter_name = '1'
             ORDER BY chunk_index
@@ -151,27 +178,14 @@ def debug_reference_search():
         raw_results = cursor.fetchall()
         print(f"   Raw results: {len(raw_results)}")
         
-        for i, result in enumerate(raw_results, 1):
-            text_lower = result['text_preview'].lower()
-            
-            # Check against exclusion patterns
-            exclude_patterns = [
-                'table of contents',
-                'overall index',
-                'bihar al-anwaar volume',
-                'page \\d+ of \\d+',
-            ]
-            
-            excluded = False
-            for pattern in exclude_patterns:
-                import re
-                if re.search(pattern, text_lower, re.IGNORECASE):
-                    excluded = True
-                    print(f"   {i}. EXCLUDED by '{pattern}': {result['text_preview'][:100]}...")
-                    break
-            
-            if not excluded:
-                print(f"   {i}. INCLUDED: {result['text_preview'][:100]}...")
+        for i, (text_preview,) in enumerate(raw_results, 1):
+            # One scan for all exclusion patterns; IGNORECASE replaces lower()
+            match = _EXCLUDE_RE.search(text_preview)
+            if match:
+                pattern = EXCLUDE_PATTERNS[match.lastindex - 1]
+                print(f"   {i}. EXCLUDED by '{pattern}': {text_preview[:100]}...")
+            else:
+                print(f"   {i}. INCLUDED: {text_preview[:100]}...")
         
     except Exception as e:
         print(f"❌ Reference search debug error: {e}")
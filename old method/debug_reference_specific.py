@@ -5,7 +5,6 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import get_db_connection
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
 def debug_reference_search_step_by_step():
     """Debug reference search step by step"""
@@ -16,7 +15,8 @@ def debug_reference_search_step_by_step():
     chapter = "1"
     
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    # Plain tuple cursor: rows are unpacked by position, no dict built per row
+    cursor = conn.cursor()
     
     try:
         # Step 1: Check raw data exists
@@ -27,7 +27,7 @@ def debug_reference_search_step_by_step():
             WHERE volume_number = %s
         """, [volume])
         
-        total = cursor.fetchone()['total']
+        total = cursor.fetchone()[0]
         print(f"   Total chunks in Volume {volume}: {total}")
         
         # Step 2: Check chapter data exists
@@ -38,7 +38,7 @@ def debug_reference_search_step_by_step():
             WHERE volume_number = %s AND chapter_name = %s
         """, [volume, chapter])
         
-        chapter_total = cursor.fetchone()['total']
+        chapter_total = cursor.fetchone()[0]
         print(f"   Chunks with Chapter {chapter}: {chapter_total}")
         
         # Step 3: Check what chapter values exist
@@ -53,7 +53,7 @@ def debug_reference_search_step_by_step():
         """, [volume])
         
         chapters = cursor.fetchall()
-        print(f"   Available chapters: {[(ch['chapter_name'], ch['count']) for ch in chapters]}")
+        print(f"   Available chapters: {chapters}")
         
         # Step 4: Test the exact query from our function
         print("\nStep 4: Test exact query from function")
@@ -62,17 +62,15 @@ def debug_reference_search_step_by_step():
                 volume_number,
                 chapter_name,
                 hadith_number,
-                arabic_text,
                 english_text,
-                LEFT(full_text, 300) as full_text,
-                metadata
+                LEFT(full_text, 300) as full_text
             FROM bihar_chunks 
             WHERE volume_number = %s
             AND LENGTH(COALESCE(english_text, full_text, '')) > 80
             AND (chapter_name = %s OR chapter_name ILIKE %s)
             ORDER BY 
                 CASE WHEN hadith_number IS NOT NULL THEN 1 ELSE 2 END,
-                CASE WHEN english_text ILIKE '%said%' OR english_text ILIKE '%narrated%' THEN 1 ELSE 2 END,
+                CASE WHEN english_text ILIKE '%%said%%' OR english_text ILIKE '%%narrated%%' THEN 1 ELSE 2 END,
                 chunk_index 
             LIMIT 25
         """
@@ -83,16 +81,16 @@ def debug_reference_search_step_by_step():
         
         print(f"   Raw query results: {len(raw_results)}")
         
-        for i, result in enumerate(raw_results[:5], 1):
-            print(f"   {i}. Vol {result['volume_number']}, Ch {result['chapter_name']}, H {result['hadith_number']}")
-            print(f"      Text: {result['full_text'][:100]}...")
+        for i, (volume_number, chapter_name, hadith_number, _, full_text) in enumerate(raw_results[:5], 1):
+            print(f"   {i}. Vol {volume_number}, Ch {chapter_name}, H {hadith_number}")
+            print(f"      Text: {(full_text or '')[:100]}...")
         
         # Step 5: Test the filtering logic
         print("\nStep 5: Test filtering logic")
         filtered_results = []
-        for result in raw_results:
-            full_text = result['full_text'].lower().strip()
-            english_text = result.get('english_text', '').lower()
+        for volume_number, chapter_name, hadith_number, english_text, raw_full_text in raw_results:
+            full_text = (raw_full_text or '').lower().strip()
+            english_text = (english_text or '').lower()
             
             # Check our exclusion patterns
             should_exclude = (
@@ -108,35 +106,34 @@ def debug_reference_search_step_by_step():
             if not should_exclude:
                 # Add quality score
                 quality_score = 0
-                if result.get('hadith_number'):
+                if hadith_number:
                     quality_score += 2
                 if any(word in english_text for word in ['said', 'narrated', 'reported', 'tradition']):
                     quality_score += 2
                 if len(english_text) > 100:
                     quality_score += 1
                 
-                result['quality_score'] = quality_score
-                filtered_results.append(result)
+                filtered_results.append((volume_number, chapter_name, hadith_number, quality_score))
                 
-                print(f"   INCLUDED: Vol {result['volume_number']}, Ch {result['chapter_name']}, Score {quality_score}")
-                print(f"      Text: {result['full_text'][:80]}...")
+                print(f"   INCLUDED: Vol {volume_number}, Ch {chapter_name}, Score {quality_score}")
+                print(f"      Text: {raw_full_text[:80]}...")
             else:
-                print(f"   EXCLUDED: {result['full_text'][:80]}...")
+                print(f"   EXCLUDED: {(raw_full_text or '')[:80]}...")
         
         print(f"\nFinal filtered results: {len(filtered_results)}")
         
         # Step 6: Check if our function would return these
         if filtered_results:
             print("\nStep 6: Our function should return these results")
-            for i, result in enumerate(filtered_results[:5], 1):
-                print(f"   {i}. Vol {result['volume_number']}, Ch {result['chapter_name']}, H {result['hadith_number']}")
+            for i, (volume_number, chapter_name, hadith_number, _) in enumerate(filtered_results[:5], 1):
+                print(f"   {i}. Vol {volume_number}, Ch {chapter_name}, H {hadith_number}")
         else:
             print("\nStep 6: No results would be returned - checking why...")
             
             # Debug why filtering failed
             print("   Debugging exclusion reasons:")
-            for result in raw_results[:3]:
-                full_text = result['full_text'].lower().strip()
+            for *_, raw_full_text in raw_results[:3]:
+                full_text = (raw_full_text or '').lower().strip()
                 print(f"   Text: {full_text[:100]}...")
                 print(f"   Length: {len(full_text)}")
                 print(f"   Has 'table of contents': {'table of contents' in full_text}")
@@ -1,40 +1,68 @@
 # main.py - Bihar ul Anwar RAG System (Updated with correct imports)
+import sys
 import time
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import anyio
+import orjson
 from typing import List, Dict, Optional, Any
 from pathlib import Path
 from contextlib import asynccontextmanager
 
+if sys.version_info < (3, 11):
+    from exceptiongroup import BaseExceptionGroup
+
 # FastAPI
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 # Local imports - UPDATED FOR NEW FUNCTION NAMES
-from config import DB_BATCH_SIZE
+from config import (
+    DB_BATCH_SIZE, DB_COPY_THRESHOLD, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS, API_THREADPOOL_SIZE, EMBEDDING_API_MAX_BATCH,
+    GZIP_MINIMUM_SIZE, METADATA_CACHE_TTL_SECONDS, get_genai_client, get_chat_model,
+    EMBEDDING_CONCURRENCY, DIRECT_ANSWER_THRESHOLD, WEB_CONCURRENCY, DEV_MODE,
+    PDF_ROOT
+)
+from cache import SemanticCache, TTLCache, make_ttl_cache, response_cache_key
 from database import (
     init_database, 
+    get_pool,
     get_database_stats, 
     get_processed_volumes, 
     search_by_reference_relaxed,      # Make sure this matches
     search_similar_chunks_relaxed,    # Make sure this matches
     batch_insert_chunks,
     record_processed_volume,
+    check_data_version,
+    on_data_change,
+    get_cached_search,
+    cache_search,
+    search_cache_stats,
     close_db_connection
 )
 
 from processing import (
-    process_pdf_text,
+    iter_pdf_chunks,
     generate_embeddings,
     generate_query_embedding,
+    query_embedding_cache_stats,
+    normalize_query,
     generate_answer_with_context  # This function is enhanced but keeps same name
 )
 
 # ===================== Pydantic Models =====================
 class QueryRequest(BaseModel):
     """Request model for querying Bihar ul Anwar"""
+    model_config = ConfigDict(extra='ignore')
+    
     query: str = Field(..., 
         description="Question about Bihar ul Anwar content",
-        example="What are the traditions about the creation of Prophet Muhammad?")
+        examples=["What are the traditions about the creation of Prophet Muhammad?"])
     top_k: int = Field(7, 
         description="Number of relevant passages to retrieve",
         ge=1, le=20)
@@ -46,44 +74,130 @@ class QueryRequest(BaseModel):
 
 class HadithResponse(BaseModel):
     """Response model for hadith queries"""
+    model_config = ConfigDict(extra='ignore')
+    
     success: bool
     query: str
     answer: str
-    references: List[Dict[str, Any]]
+    references: List[dict]
     processing_time: float
     total_sources: int
 
 class ProcessingRequest(BaseModel):
     """Request for processing Bihar ul Anwar volumes"""
+    model_config = ConfigDict(extra='ignore')
+    
     file_path: str = Field(..., 
         description="Path to Bihar ul Anwar PDF",
-        example="C:/BiharUlAnwar/Volume_1.pdf")
+        examples=["C:/BiharUlAnwar/Volume_1.pdf"])
     volume_number: int = Field(..., 
         description="Volume number (1-110)",
         ge=1, le=110)
     language: str = Field("mixed", 
         description="Content language: arabic, english, or mixed")
+    embedding_concurrency: int = Field(EMBEDDING_CONCURRENCY, 
+        description="Embedding API requests in flight at once",
+        ge=1, le=16)
 
 # ===================== FastAPI App Setup =====================
+# Paraphrase-tolerant response cache, created at startup
+semantic_cache: Optional[SemanticCache] = None
+
+# Byte-identical requests skip embedding, search and generation
+response_cache = make_ttl_cache(
+    'exact', RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS, dumps=orjson.dumps, loads=orjson.loads
+)
+
+# /volumes and database statistics, polled often by dashboards and n8n
+metadata_cache = TTLCache(maxsize=4, ttl_seconds=METADATA_CACHE_TTL_SECONDS)
+
+def _clear_response_caches():
+    """Forget answers and statistics that predate newly loaded volumes"""
+    response_cache.clear()
+    metadata_cache.clear()
+    if semantic_cache is not None:
+        semantic_cache.clear()
+
+# Each server worker has its own caches; a volume loaded through another worker is
+# noticed by the processed_volumes version check
+on_data_change(_clear_response_caches)
+
+def _cached_response(key: str) -> Optional[Dict]:
+    """Exact-match cached response, after dropping caches that predate new data"""
+    check_data_version()
+    return response_cache.get(key)
+
+async def _database_stats() -> Dict:
+    """Database statistics, served from metadata_cache while fresh"""
+    stats = metadata_cache.get('stats')
+    if stats is None:
+        stats = await anyio.to_thread.run_sync(get_database_stats)
+        metadata_cache.set('stats', stats)
+    return stats
+
+# ===================== Logging =====================
+# Request handlers only enqueue records; the listener thread does the blocking writes
+logger = logging.getLogger("bihar")
+_log_queue = queue.SimpleQueue()
+_log_handler = QueueHandler(_log_queue)
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+
+def start_queue_logging():
+    """Route app and uvicorn access logs through the queue and start the writer thread"""
+    root = logging.getLogger()
+    root.addHandler(_log_handler)
+    root.setLevel(logging.INFO)
+    logging.getLogger("uvicorn.access").handlers = [_log_handler]
+    _log_listener.start()
+
+def stop_queue_logging():
+    """Flush queued records and stop the writer thread"""
+    _log_listener.stop()
+    logging.getLogger().removeHandler(_log_handler)
+    logging.getLogger("uvicorn.access").removeHandler(_log_handler)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global semantic_cache
+    
     # Startup
-    print("🚀 Starting Enhanced Bihar ul Anwar RAG System...")
-    print("📚 System designed for 110 volumes of Bihar ul Anwar")
-    print("🔍 Swagger UI will be available at: http://localhost:8000/docs")
+    start_queue_logging()
+    
+    # Blocking embedding, LLM and DB calls run in this threadpool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+    
+    semantic_cache = SemanticCache(
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        max_entries=SEMANTIC_CACHE_SIZE,
+        ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS
+    )
+    
+    logger.info("🚀 Starting Enhanced Bihar ul Anwar RAG System...")
+    logger.info("📚 System designed for 110 volumes of Bihar ul Anwar")
+    logger.info("🔍 Swagger UI will be available at: http://localhost:8000/docs")
+    
+    try:
+        # Open the pool's minconn connections now so first requests skip the connect
+        app.state.pool = await anyio.to_thread.run_sync(get_pool)
+        await anyio.to_thread.run_sync(init_database)
+        logger.info("✅ Enhanced Bihar ul Anwar RAG System started")
+        logger.info("📖 Access Swagger UI at: http://localhost:8000/docs")
+    except Exception as e:
+        logger.error("❌ Startup failed: %s", e)
     
     try:
-        init_database()
-        print("✅ Enhanced Bihar ul Anwar RAG System started")
-        print("📖 Access Swagger UI at: http://localhost:8000/docs")
+        # Build the Gemini client once, before concurrent requests race to create it
+        app.state.genai = await anyio.to_thread.run_sync(get_genai_client)
+        await anyio.to_thread.run_sync(get_chat_model)
     except Exception as e:
-        print(f"❌ Startup failed: {e}")
+        logger.error("❌ Gemini client setup failed: %s", e)
     
     yield
     
     # Shutdown
-    close_db_connection()
-    print("📚 Shutting down...")
+    await anyio.to_thread.run_sync(close_db_connection)
+    logger.info("📚 Shutting down...")
+    stop_queue_logging()
 
 app = FastAPI(
     title="Enhanced Bihar ul Anwar RAG System",
@@ -104,9 +218,14 @@ app = FastAPI(
     version="2.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson writes Arabic as raw UTF-8 instead of \uXXXX escapes
+    default_response_class=ORJSONResponse
 )
 
+# Compress larger JSON bodies; added first so CORS stays the outermost layer
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # CORS for n8n
 app.add_middleware(
     CORSMiddleware,
@@ -121,7 +240,7 @@ app.add_middleware(
 @app.get("/")
 async def root():
     """Health check and system information"""
-    stats = get_database_stats()
+    stats = await _database_stats()
     
     return {
         "status": "healthy",
@@ -139,7 +258,39 @@ async def root():
         ]
     }
 
-@app.post("/query", response_model=HadithResponse, tags=["Search"])
+# /query returns pre-serialized bodies; cached payloads were validated when first built
+hadith_adapter = TypeAdapter(HadithResponse)
+
+def _hadith_json(response: HadithResponse) -> ORJSONResponse:
+    """Serialize a HadithResponse once, bypassing FastAPI's response_model pass"""
+    return ORJSONResponse(hadith_adapter.dump_python(response, mode='json'))
+
+def _format_reference(chunk: Dict, include_arabic: bool) -> Dict[str, Any]:
+    """Clean reference entry for one retrieved chunk"""
+    metadata = chunk.get('metadata') or {}
+    chapter = metadata.get('chapter')
+    hadith_number = metadata.get('hadith_number')
+    
+    # Build clean reference
+    reference = f"Bihar ul Anwar, Volume {chunk['volume_number']}"
+    if chapter:
+        reference += f", Chapter {chapter}"
+    if hadith_number:
+        reference += f", Hadith {hadith_number}"
+    
+    english_text = chunk['english_text']
+    arabic_text = chunk['arabic_text']
+    return {
+        'volume': chunk['volume_number'],
+        'chapter': chapter if 'chapter' in metadata else 'Not specified',
+        'hadith_number': hadith_number if 'hadith_number' in metadata else 'Not specified',
+        'similarity_score': float(chunk['similarity']),
+        'reference': reference,
+        'excerpt_english': english_text[:150] if english_text else "",
+        'excerpt_arabic': arabic_text[:150] if arabic_text and include_arabic else ""
+    }
+
+@app.post("/query", responses={200: {"model": HadithResponse}}, tags=["Search"])
 async def search_bihar_anwar(request: QueryRequest):
     """
     Enhanced Search Bihar ul Anwar for hadith and traditions
@@ -150,57 +301,77 @@ async def search_bihar_anwar(request: QueryRequest):
     start_time = time.time()
     
     try:
+        # Whitespace variants share one embedding, so they also share cached
+        # search results and responses
+        normalized = normalize_query(request.query)
+        response_key = response_cache_key(
+            normalized, request.top_k, request.volume_filter, request.include_arabic
+        )
+        # May be a database or Redis round trip, so kept off the event loop
+        cached = await anyio.to_thread.run_sync(_cached_response, response_key)
+        if cached is not None:
+            return ORJSONResponse({
+                **cached,
+                'query': request.query,
+                'processing_time': time.time() - start_time
+            })
+        
         # Generate query embedding
-        query_embedding = generate_query_embedding(request.query)
+        query_embedding = await anyio.to_thread.run_sync(generate_query_embedding, request.query)
         
-        # Enhanced search for relevant chunks
-        chunks = search_similar_chunks_relaxed(
-            query_embedding, 
-            request.top_k,
-            request.volume_filter
-            )
+        # Close paraphrases of an earlier query reuse its whole response; the
+        # similarity scan over every cached vector runs off the event loop
+        cache_scope = (request.top_k, request.volume_filter, request.include_arabic)
+        if semantic_cache is not None:
+            cached = await anyio.to_thread.run_sync(semantic_cache.lookup, query_embedding, cache_scope)
+            if cached is not None:
+                return ORJSONResponse({
+                    **cached,
+                    'query': request.query,
+                    'processing_time': time.time() - start_time
+                })
+        
+        # Repeated queries reuse earlier results until the data changes
+        cache_key = (normalized, request.top_k, request.volume_filter)
+        chunks = await anyio.to_thread.run_sync(get_cached_search, cache_key)
+        
+        if chunks is None:
+            # Enhanced search for relevant chunks
+            chunks = await anyio.to_thread.run_sync(
+                search_similar_chunks_relaxed,
+                query_embedding, 
+                request.top_k,
+                request.volume_filter
+                )
+            cache_search(cache_key, chunks)
         
         if not chunks:
-            return HadithResponse(
+            return _hadith_json(HadithResponse(
                 success=False,
                 query=request.query,
                 answer="No relevant traditions found in Bihar ul Anwar for your query.",
                 references=[],
                 processing_time=time.time() - start_time,
                 total_sources=0
-            )
-        
-        # Generate enhanced answer with strict content controls
-        answer = generate_answer_with_context(
-            request.query,
-            chunks,
-            request.include_arabic
-        )
+            ))
         
         # Format references with clean format
-        references = []
-        for chunk in chunks:
-            metadata = chunk.get('metadata', {})
-            
-            # Build clean reference
-            ref_parts = [f"Volume {chunk['volume_number']}"]
-            if metadata.get('chapter'):
-                ref_parts.append(f"Chapter {metadata['chapter']}")
-            if metadata.get('hadith_number'):
-                ref_parts.append(f"Hadith {metadata['hadith_number']}")
-            
-            ref = {
-                'volume': chunk['volume_number'],
-                'chapter': metadata.get('chapter', 'Not specified'),
-                'hadith_number': metadata.get('hadith_number', 'Not specified'),
-                'similarity_score': round(float(chunk['similarity']), 3),
-                'reference': f"Bihar ul Anwar, {', '.join(ref_parts)}",
-                'excerpt_english': chunk['english_text'][:150] if chunk['english_text'] else "",
-                'excerpt_arabic': chunk['arabic_text'][:150] if chunk['arabic_text'] and request.include_arabic else ""
-            }
-            references.append(ref)
+        references = [_format_reference(chunk, request.include_arabic) for chunk in chunks]
         
-        return HadithResponse(
+        top = chunks[0]
+        if request.top_k == 1 and top['similarity'] > DIRECT_ANSWER_THRESHOLD and top['english_text']:
+            # A near-exact single match answers itself; skip the generation call
+            answer = f"{top['english_text']}\n\nReference: {references[0]['reference']}"
+        else:
+            # Generate enhanced answer with strict content controls
+            answer = await anyio.to_thread.run_sync(
+                generate_answer_with_context,
+                request.query,
+                chunks,
+                request.include_arabic
+            )
+        
+        response = HadithResponse(
             success=True,
             query=request.query,
             answer=answer,
@@ -209,44 +380,142 @@ async def search_bihar_anwar(request: QueryRequest):
             total_sources=len(references)
         )
         
+        payload = hadith_adapter.dump_python(response, mode='json')
+        await anyio.to_thread.run_sync(response_cache.set, response_key, payload)
+        if semantic_cache is not None:
+            await anyio.to_thread.run_sync(semantic_cache.insert, query_embedding, cache_scope, payload)
+        
+        return ORJSONResponse(payload)
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ingest_volume(file_path: str, volume_number: int, concurrency: int = EMBEDDING_CONCURRENCY) -> int:
+    """Stream a volume through extraction, embedding and insertion; returns chunks stored"""
+    stored = 0
+    # Small buffers keep only a few shards/batches in memory between stages
+    shard_send, shard_receive = anyio.create_memory_object_stream(max_buffer_size=2)
+    embedded_send, embedded_receive = anyio.create_memory_object_stream(max_buffer_size=2)
+    # Embedding batches in flight at once
+    embed_slots = anyio.Semaphore(concurrency)
+    
+    async def producer():
+        shards = iter_pdf_chunks(file_path, volume_number, max_pages=100)
+        try:
+            async with shard_send:
+                while True:
+                    chunks = await anyio.to_thread.run_sync(next, shards, None)
+                    if chunks is None:
+                        break
+                    if chunks:
+                        await shard_send.send(chunks)
+        finally:
+            # Shut the extraction processes down even when a later stage failed
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(shards.close)
+    
+    async def embed(batch: List[Dict]):
+        texts = [chunk['full_text'] for chunk in batch]
+        embeddings = await anyio.to_thread.run_sync(generate_embeddings, texts, EMBEDDING_API_MAX_BATCH)
+        # Rows of the array, not copies
+        for chunk, embedding in zip(batch, embeddings):
+            chunk['embedding'] = embedding
+        await embedded_send.send(batch)
+    
+    async def embed_and_release(batch: List[Dict]):
+        try:
+            await embed(batch)
+        finally:
+            embed_slots.release()
+    
+    async def embed_worker():
+        async with shard_receive, embedded_send, anyio.create_task_group() as embed_tg:
+            pending = []
+            async for chunks in shard_receive:
+                pending.extend(chunks)
+                while len(pending) >= EMBEDDING_API_MAX_BATCH:
+                    # Take a slot before starting so waiting batches stay in pending
+                    await embed_slots.acquire()
+                    embed_tg.start_soon(embed_and_release, pending[:EMBEDDING_API_MAX_BATCH])
+                    pending = pending[EMBEDDING_API_MAX_BATCH:]
+            if pending:
+                await embed_slots.acquire()
+                embed_tg.start_soon(embed_and_release, pending)
+    
+    async def db_writer():
+        nonlocal stored
+        pending = []
+        
+        async def flush():
+            nonlocal stored, pending
+            # Full buffers take the COPY path; the tail of a volume is a multi-row INSERT
+            stored += await anyio.to_thread.run_sync(batch_insert_chunks, pending, DB_BATCH_SIZE)
+            pending = []
+            logger.info("📝 Stored %d chunks so far", stored)
+        
+        async with embedded_receive:
+            # Embedding batches hold at most EMBEDDING_API_MAX_BATCH chunks; gather them
+            # so each write is large enough to be a COPY
+            async for batch in embedded_receive:
+                pending.extend(batch)
+                if len(pending) >= DB_COPY_THRESHOLD:
+                    await flush()
+            if pending:
+                await flush()
+    
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(producer)
+            tg.start_soon(embed_worker)
+            tg.start_soon(db_writer)
+    except BaseExceptionGroup as eg:
+        # Surface the failing stage's own error rather than the group wrapper;
+        # a stage's own task group can nest one group inside another
+        exc = eg
+        while isinstance(exc, BaseExceptionGroup):
+            exc = exc.exceptions[0]
+        raise exc
+    
+    return stored
+
+def _validate_pdf_path(file_path: str) -> str:
+    """Resolved path of an existing PDF inside PDF_ROOT (when set); 400 otherwise"""
+    path = Path(file_path).expanduser().resolve()
+    if path.suffix.lower() != '.pdf' or not path.is_file():
+        raise HTTPException(status_code=400, detail=f"Not a PDF file: {file_path}")
+    if PDF_ROOT and not path.is_relative_to(Path(PDF_ROOT).expanduser().resolve()):
+        raise HTTPException(status_code=400, detail=f"File is outside the PDF directory: {file_path}")
+    return str(path)
+
 @app.post("/process-volume", tags=["Processing"])
 async def process_bihar_volume(request: ProcessingRequest):
     """Process a Bihar ul Anwar volume PDF with enhanced metadata extraction"""
     start_time = time.time()
+    request.file_path = _validate_pdf_path(request.file_path)
     
     try:
-        print(f"\n📖 Processing Volume {request.volume_number} (Enhanced)")
-        print(f"🔍 File: {request.file_path}")
+        logger.info("📖 Processing Volume %d (Enhanced)", request.volume_number)
+        logger.info("🔍 File: %s", request.file_path)
         
-        # Extract text and create chunks
-        chunks = process_pdf_text(request.file_path, request.volume_number, max_pages=100)
+        # Extract, embed and insert concurrently
+        stored = await _ingest_volume(
+            request.file_path, request.volume_number, request.embedding_concurrency
+        )
         
-        if not chunks:
+        if not stored:
             return {"success": False, "message": "No text extracted from PDF"}
         
-        print(f"📝 Created {len(chunks)} text chunks")
-        
-        # Generate embeddings
-        texts = [chunk['full_text'] for chunk in chunks]
-        embeddings = generate_embeddings(texts, batch_size=2)
-        
-        # Add embeddings to chunks
-        for chunk, embedding in zip(chunks, embeddings):
-            chunk['embedding'] = embedding
-        
-        # Batch insert to database
-        stored = batch_insert_chunks(chunks, batch_size=DB_BATCH_SIZE)
-        
         # Record processed volume
-        record_processed_volume(
+        await anyio.to_thread.run_sync(
+            record_processed_volume,
             request.volume_number, 
             Path(request.file_path).name, 
             stored
         )
         
+        # Cached answers and statistics predate the new volume
+        await anyio.to_thread.run_sync(_clear_response_caches)
+        
         processing_time = time.time() - start_time
         
         return {
@@ -262,7 +531,7 @@ async def process_bihar_volume(request: ProcessingRequest):
     except Exception as e:
         processing_time = time.time() - start_time
         error_msg = str(e)
-        print(f"❌ Volume {request.volume_number} failed: {error_msg}")
+        logger.error("❌ Volume %d failed: %s", request.volume_number, error_msg)
         
         return {
             "success": False,
@@ -274,13 +543,21 @@ async def process_bihar_volume(request: ProcessingRequest):
 @app.get("/volumes", tags=["Information"])
 async def list_processed_volumes():
     """List all processed Bihar ul Anwar volumes"""
-    volumes = get_processed_volumes()
+    cached = metadata_cache.get('volumes')
+    if cached is not None:
+        return ORJSONResponse(cached)
     
-    return {
+    volumes = await anyio.to_thread.run_sync(get_processed_volumes)
+    processed = {v['volume_number'] for v in volumes}
+    
+    result = {
         "total_volumes": len(volumes),
         "volumes": volumes,
-        "missing_volumes": [i for i in range(1, 111) if i not in [v['volume_number'] for v in volumes]]
+        "missing_volumes": [i for i in range(1, 111) if i not in processed]
     }
+    metadata_cache.set('volumes', result)
+    # Rows hold only ints and datetimes, which orjson encodes without jsonable_encoder
+    return ORJSONResponse(result)
 
 @app.get("/search-by-reference", tags=["Search"])
 async def search_by_reference(
@@ -290,7 +567,7 @@ async def search_by_reference(
 ):
     """Enhanced search for specific hadith by reference with content filtering"""
     try:
-        results = search_by_reference_relaxed(volume, chapter, hadith)
+        results = await anyio.to_thread.run_sync(search_by_reference_relaxed, volume, chapter, hadith)
         
         # Format results with clean references
         formatted_results = []
@@ -306,13 +583,14 @@ async def search_by_reference(
             formatted_result['clean_reference'] = f"Bihar ul Anwar, {', '.join(ref_parts)}"
             formatted_results.append(formatted_result)
         
-        return {
+        # Rows are plain str/int/JSONB values; orjson encodes them directly
+        return ORJSONResponse({
             "success": True,
             "query": f"Volume {volume}, Chapter {chapter or 'Any'}, Hadith {hadith or 'Any'}",
             "results": formatted_results,
             "count": len(formatted_results),
             "enhancement": "Content filtered and quality ranked"
-        }
+        })
     except Exception as e:
         return {
             "success": False,
@@ -324,7 +602,7 @@ async def search_by_reference(
 @app.get("/statistics", tags=["Information"])
 async def get_statistics():
     """Get enhanced Bihar ul Anwar database statistics"""
-    stats = get_database_stats()
+    stats = await _database_stats()
     
     return {
         "success": True,
@@ -334,7 +612,19 @@ async def get_statistics():
             "chapters_extracted": f"{stats['total_chapters']} unique chapters",
             "hadiths_extracted": f"{stats['total_hadiths']} unique hadiths",
             "bilingual_support": f"{stats['chunks_with_arabic']} Arabic, {stats['chunks_with_english']} English"
-        }
+        },
+        "response_cache": await anyio.to_thread.run_sync(response_cache.stats)
+    }
+
+@app.get("/cache/stats", tags=["Information"])
+async def get_cache_stats():
+    """Sizes and hit rates of the query, search and response caches"""
+    return {
+        "success": True,
+        "query_embeddings": await anyio.to_thread.run_sync(query_embedding_cache_stats),
+        "search_results": search_cache_stats(),
+        "responses": await anyio.to_thread.run_sync(response_cache.stats),
+        "semantic_responses": semantic_cache.stats() if semantic_cache is not None else None
     }
 
 # ===================== Run Server =====================
@@ -346,9 +636,13 @@ if __name__ == "__main__":
     print("🔍 Enhanced with content filtering and quality controls")
     print("📖 Swagger UI will be available at: http://localhost:8000/docs")
     
+    # An import string lets uvicorn start several workers or a reloader
     uvicorn.run(
-        app,
+        "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        loop="auto",    # uvloop when installed
+        http="auto",    # httptools when installed
+        workers=1 if DEV_MODE else WEB_CONCURRENCY,
+        reload=DEV_MODE
     )
\ No newline at end of file
@@ -4,7 +4,7 @@ import os
 import re
 from typing import Dict, List, Tuple, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from database import get_db_connection
@@ -309,7 +309,7 @@ def fix_metadata_for_volumes(volume_list: List[int] = [1, 3, 7], limit_per_volum
             chunks = cursor.fetchall()
             print(f"   Found {len(chunks)} chunks to process")
             
-            volume_fixed = 0
+            updates = []
             
             for i, chunk in enumerate(chunks):
                 if i % 50 == 0:  # Progress update
@@ -336,15 +336,8 @@ def fix_metadata_for_volumes(volume_list: List[int] = [1, 3, 7], limit_per_volum
                         update_needed = True
                     
                     if update_needed:
-                        # Update the database
-                        cursor.execute("""
-                            UPDATE bihar_chunks 
-                            SET 
-                                chapter_name = %s,
-                                hadith_number = %s,
-                                metadata = metadata || %s
-                            WHERE id = %s
-                        """, (
+                        updates.append((
+                            chunk['id'],
                             new_chapter,
                             new_hadith,
                             Json({
@@ -353,12 +346,23 @@ def fix_metadata_for_volumes(volume_list: List[int] = [1, 3, 7], limit_per_volum
                                 'extraction_method': extracted['extraction_method'],
                                 'confidence': extracted['confidence'],
                                 'fixed_metadata': True
-                            }),
-                            chunk['id']
+                            })
                         ))
-                        
-                        volume_fixed += 1
-                        total_fixed += 1
+            
+            # Update the database in one statement per volume
+            if updates:
+                execute_values(cursor, """
+                    UPDATE bihar_chunks AS b
+                    SET 
+                        chapter_name = v.chapter_name,
+                        hadith_number = v.hadith_number,
+                        metadata = b.metadata || v.extra
+                    FROM (VALUES %s) AS v(id, chapter_name, hadith_number, extra)
+                    WHERE b.id = v.id
+                """, updates, template="(%s, %s, %s, %s::jsonb)", page_size=500)
+            
+            volume_fixed = len(updates)
+            total_fixed += volume_fixed
             
             # Commit changes for this volume
             conn.commit()
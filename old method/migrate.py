@@ -0,0 +1,26 @@
+# migrate.py - Apply one-off schema and data migrations
+import sys
+import os
+import logging
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import init_database, migrate_database, close_db_connection
+
+def main():
+    """Create the schema, then apply every migration not yet recorded"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print("🔧 BIHAR UL ANWAR DATABASE MIGRATION")
+    print("=" * 50)
+    
+    try:
+        init_database()
+        applied = migrate_database()
+        if applied:
+            print(f"✅ Applied migrations: {applied}")
+        else:
+            print("✅ Database is up to date")
+    finally:
+        close_db_connection()
+
+if __name__ == "__main__":
+    main()
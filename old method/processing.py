@@ -3,45 +3,50 @@ import time
 import re
 import gc
 import os
-from typing import List, Dict
+import mmap
+import multiprocessing
+import queue
+import threading
+import hashlib
+import functools
+import random
+from collections import deque
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional
 from pathlib import Path
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pypdf import PdfReader
-from config import EMBEDDING_MODEL, CHAT_MODEL, CHUNK_SIZE, CHUNK_OVERLAP
+from cache import make_ttl_cache
+from config import (
+    EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, get_chat_model, configure_genai,
+    EMBEDDING_DYNAMIC_BATCH_MAX, EMBEDDING_BATCH_TIMEOUT_MS, EMBEDDING_BATCH,
+    QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    PDF_EXTRACT_WORKERS, PDF_PAGES_PER_BATCH, PDF_PAGES_PER_SHARD,
+    EMBEDDING_API_MAX_BATCH, MAX_CHUNK_LENGTH, EMBEDDING_MAX_RETRIES, EMBEDDING_BACKOFF_SECONDS,
+    ENHANCED_SYSTEM_PROMPT
+)
 
 # OPTIMIZED LIMITS FOR BETTER PERFORMANCE
 MAX_PAGES_PER_VOLUME = 100  # Reduced from 200
-EMBEDDING_BATCH_SIZE = 2    # Reduced from 3
 PROCESSING_DELAY = 0.5      # Increased delay between API calls
 
-# ENHANCED SYSTEM PROMPT FOR BIHAR UL ANWAR
-ENHANCED_SYSTEM_PROMPT = """You are a specialist in Bihar ul Anwar, the 110-volume hadith collection by Allama Muhammad Baqir Majlisi. You MUST follow these strict rules:
-
-CONTENT RULES:
-1. Use ONLY the provided excerpts from Bihar ul Anwar - NO external knowledge
-2. If the excerpts don't contain enough information, say "The provided excerpts are insufficient"
-3. NEVER add general Islamic knowledge not found in the excerpts
-4. Focus ONLY on actual hadith/traditions, NOT table of contents or indexes
-
-REFERENCE RULES:
-1. ALWAYS cite sources as: "Bihar ul Anwar, Volume X, Chapter Y, Hadith Z"
-2. If hadith number is missing, use: "Bihar ul Anwar, Volume X, Chapter Y"
-3. If chapter is missing, use: "Bihar ul Anwar, Volume X"
-4. NEVER include long quotes - only give clean references
-
-RESPONSE FORMAT:
-1. Start with a direct answer based ONLY on provided content
-2. List specific references at the end
-3. If asking about a chapter summary, extract ONLY key points from that chapter
-4. Do NOT elaborate beyond what's in the excerpts
-
-FORBIDDEN:
-- General Islamic explanations not in the text
-- Interpretations beyond the provided content  
-- Long quotations in responses
-- References to sources other than Bihar ul Anwar
-- Table of contents or index information as hadith content"""
+# Metadata patterns, compiled once and tried in priority order
+_CHAPTER_PATTERNS = tuple(re.compile(p) for p in (
+    r'chapter\s+(\d+)',
+    r'bab\s+(\d+)', 
+    r'باب\s+(\d+)',
+    r'ch(?:apter)?\.?\s*(\d+)'
+))
+_HADITH_PATTERNS = tuple(re.compile(p) for p in (
+    r'hadith\s+#?(\d+)',
+    r'tradition\s+#?(\d+)',
+    r'h\.?\s*(\d+)',
+    r'حديث\s+(\d+)'
+))
+_ARABIC_CHAR_RE = re.compile(r'[\u0600-\u06FF]')
 
 def extract_hadith_metadata(text: str, volume_num: int) -> Dict:
     """Extract hadith metadata from text - OPTIMIZED"""
@@ -54,30 +59,14 @@ def extract_hadith_metadata(text: str, volume_num: int) -> Dict:
     # Only check first 500 characters for metadata
     text_sample = text[:500].lower()
     
-    # Chapter patterns
-    chapter_patterns = [
-        r'chapter\s+(\d+)',
-        r'bab\s+(\d+)', 
-        r'باب\s+(\d+)',
-        r'ch(?:apter)?\.?\s*(\d+)'
-    ]
-    
-    for pattern in chapter_patterns:
-        match = re.search(pattern, text_sample)
+    for pattern in _CHAPTER_PATTERNS:
+        match = pattern.search(text_sample)
         if match:
             metadata['chapter'] = match.group(1)
             break
     
-    # Hadith patterns
-    hadith_patterns = [
-        r'hadith\s+#?(\d+)',
-        r'tradition\s+#?(\d+)',
-        r'h\.?\s*(\d+)',
-        r'حديث\s+(\d+)'
-    ]
-    
-    for pattern in hadith_patterns:
-        match = re.search(pattern, text_sample)
+    for pattern in _HADITH_PATTERNS:
+        match = pattern.search(text_sample)
         if match:
             metadata['hadith_number'] = match.group(1)
             break
@@ -89,8 +78,9 @@ def split_arabic_english(text: str) -> tuple:
     if not text or len(text) < 10:
         return "", text
     
-    arabic_text = ""
-    english_text = ""
+    # Lines are collected and joined once; += on a growing string copies it every time
+    arabic_lines = []
+    english_lines = []
     
     lines = text.split('\n')
     # Process max 50 lines to save time
@@ -99,231 +89,489 @@ def split_arabic_english(text: str) -> tuple:
         if not line or len(line) < 3:
             continue
             
-        # Count Arabic characters
-        arabic_count = sum(1 for char in line if '\u0600' <= char <= '\u06FF')
-        total_chars = len([c for c in line if c.isalpha()])
+        # Count Arabic characters (regex scan instead of a per-character Python loop)
+        arabic_count = len(_ARABIC_CHAR_RE.findall(line))
+        total_chars = sum(map(str.isalpha, line))
         
         if total_chars > 0 and arabic_count / total_chars > 0.3:  # 30% threshold
-            arabic_text += line + "\n"
+            arabic_lines.append(line)
         else:
-            english_text += line + "\n"
+            english_lines.append(line)
     
     # Limit length to prevent excessive text
-    return arabic_text.strip()[:1000], english_text.strip()[:1000]
+    return '\n'.join(arabic_lines)[:1000], '\n'.join(english_lines)[:1000]
+
+def open_pdf(pdf_path: str) -> PdfReader:
+    """PdfReader over a read-only memory map, so pages are paged in lazily and shared between workers"""
+    with open(pdf_path, 'rb') as f:
+        # The map stays valid after the file is closed; the reader keeps it alive
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mapped)
+
+@functools.lru_cache(maxsize=1)
+def _get_splitter() -> RecursiveCharacterTextSplitter:
+    """Text splitter shared by the sequential and parallel PDF paths, built once per process"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ".", "۔", "।"],
+        length_function=len
+    )
+
+def _inspect_pdf(pdf_path: str, max_pages: int) -> tuple:
+    """File size in MB, total page count and number of pages to process"""
+    print(f"📖 Processing PDF: {Path(pdf_path).name}")
+    
+    # Check file size first
+    file_size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+    print(f"📊 File size: {file_size_mb:.1f} MB")
+    
+    # Adjust max pages based on file size
+    if file_size_mb > 8:  # Large files
+        max_pages = min(max_pages, 50)
+        print(f"⚠️ Large file detected, limiting to {max_pages} pages")
+    
+    total_pages = len(open_pdf(pdf_path).pages)
+    pages_to_process = min(total_pages, max_pages)
+    
+    print(f"📄 Processing {pages_to_process}/{total_pages} pages")
+    return file_size_mb, total_pages, pages_to_process
+
+# Set in each extraction worker process by _init_pdf_worker
+_worker_reader: Optional[PdfReader] = None
+
+def _init_pdf_worker(pdf_path: str):
+    """Open the PDF once per worker process, so its cross-reference table is parsed once, not per shard"""
+    global _worker_reader
+    _worker_reader = open_pdf(pdf_path)
+
+def _extract_pages(pdf_path: str, volume_num: int, page_start: int, page_end: int,
+                   total_pages: int, file_size_mb: float, reader: Optional[PdfReader] = None) -> List[Dict]:
+    """Chunk pages [page_start, page_end) in 3-page batches; runs in worker processes"""
+    # PdfReader objects are not picklable, so each worker opens the file itself
+    if reader is None:
+        reader = _worker_reader or open_pdf(pdf_path)
+    splitter = _get_splitter()
+    
+    all_chunks = []
+    
+    # Process in smaller batches to reduce memory usage
+    batch_size = PDF_PAGES_PER_BATCH
+    
+    for batch_start in range(page_start, page_end, batch_size):
+        batch_end = min(batch_start + batch_size, page_end)
+        print(f"  📝 Processing pages {batch_start + 1}-{batch_end}")
+        
+        # Extract text from current batch
+        page_texts = []
+        for page_num in range(batch_start, batch_end):
+            try:
+                text = reader.pages[page_num].extract_text()
+                if text and text.strip():
+                    # Clean the text
+                    cleaned_text = text.replace('\x00', '').strip()
+                    if len(cleaned_text) > 50:  # Only add substantial text
+                        page_texts.append(f"\n--- Page {page_num + 1} ---\n" + cleaned_text)
+            except Exception as e:
+                print(f"    ⚠️ Error on page {page_num + 1}: {e}")
+                continue
+        batch_text = ''.join(page_texts)
+        
+        if not batch_text.strip():
+            print(f"    ⚠️ No text extracted from pages {batch_start + 1}-{batch_end}")
+            continue
+        
+        # Split into chunks
+        try:
+            chunks = splitter.split_text(batch_text)
+            print(f"    ✅ Created {len(chunks)} chunks from pages {batch_start + 1}-{batch_end}")
+            
+            for chunk in chunks:
+                if len(chunk.strip()) < 50:  # Skip tiny chunks
+                    continue
+                
+                # Separate Arabic and English
+                arabic, english = split_arabic_english(chunk)
+                
+                # Extract metadata
+                metadata = extract_hadith_metadata(chunk, volume_num)
+                metadata['pages_processed'] = f"{batch_start + 1}-{batch_end}"
+                metadata['total_pages'] = total_pages
+                metadata['file_size_mb'] = round(file_size_mb, 1)
+                
+                chunk_data = {
+                    'volume_number': volume_num,
+                    'arabic_text': arabic,
+                    'english_text': english,
+                    'full_text': chunk,
+                    'chunk_index': len(all_chunks),  # Renumbered by the caller when sharded
+                    'metadata': metadata
+                }
+                
+                all_chunks.append(chunk_data)
+            
+        except Exception as e:
+            print(f"    ❌ Error processing batch {batch_start + 1}-{batch_end}: {e}")
+            continue
+        
+        # Memory cleanup after each batch
+        del batch_text, chunks
+        gc.collect()
+    
+    return all_chunks
 
 def process_pdf_text(pdf_path: str, volume_num: int, max_pages: int = MAX_PAGES_PER_VOLUME) -> List[Dict]:
     """Process PDF and extract text chunks - OPTIMIZED"""
     try:
-        print(f"📖 Processing PDF: {Path(pdf_path).name}")
-        
-        # Check file size first
-        file_size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
-        print(f"📊 File size: {file_size_mb:.1f} MB")
+        file_size_mb, total_pages, pages_to_process = _inspect_pdf(pdf_path, max_pages)
+        all_chunks = _extract_pages(pdf_path, volume_num, 0, pages_to_process, total_pages, file_size_mb)
         
-        # Adjust max pages based on file size
-        if file_size_mb > 8:  # Large files
-            max_pages = min(max_pages, 50)
-            print(f"⚠️ Large file detected, limiting to {max_pages} pages")
-        
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        pages_to_process = min(total_pages, max_pages)
+        print(f"✅ Total chunks created: {len(all_chunks)} from {pages_to_process} pages")
+        return all_chunks
         
-        print(f"📄 Processing {pages_to_process}/{total_pages} pages")
+    except Exception as e:
+        print(f"❌ PDF processing error: {str(e)}")
+        raise Exception(f"Error processing PDF: {str(e)}")
+
+def iter_pdf_chunks(pdf_path: str, volume_num: int, max_pages: int = MAX_PAGES_PER_VOLUME,
+                    workers: Optional[int] = None) -> Iterator[List[Dict]]:
+    """Yield chunk lists shard by shard in page order, extracting shards in worker processes"""
+    try:
+        file_size_mb, total_pages, pages_to_process = _inspect_pdf(pdf_path, max_pages)
         
-        # Optimized text splitter
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ".", "۔", "।"],
-            length_function=len
-        )
+        # Shards start on batch boundaries so page grouping, and therefore chunking, is unchanged
+        shards = [(start, min(start + PDF_PAGES_PER_SHARD, pages_to_process))
+                  for start in range(0, pages_to_process, PDF_PAGES_PER_SHARD)]
+        workers = max(1, min(workers or PDF_EXTRACT_WORKERS, PDF_EXTRACT_WORKERS, len(shards)))
+        print(f"⚙️ Extracting {len(shards)} page shards on {workers} processes")
         
-        all_chunks = []
+        chunk_index = 0
+        total_chunks = 0
         
-        # Process in smaller batches to reduce memory usage
-        batch_size = 3  # Process 3 pages at a time
+        def renumber(chunks: List[Dict]) -> List[Dict]:
+            nonlocal chunk_index, total_chunks
+            for chunk in chunks:
+                chunk['chunk_index'] = chunk_index
+                chunk_index += 1
+            total_chunks += len(chunks)
+            return chunks
         
-        for batch_start in range(0, pages_to_process, batch_size):
-            batch_end = min(batch_start + batch_size, pages_to_process)
-            print(f"  📝 Processing pages {batch_start + 1}-{batch_end}")
-            
-            # Extract text from current batch
-            batch_text = ""
-            for page_num in range(batch_start, batch_end):
-                try:
-                    text = reader.pages[page_num].extract_text()
-                    if text and text.strip():
-                        # Clean the text
-                        cleaned_text = text.replace('\x00', '').strip()
-                        if len(cleaned_text) > 50:  # Only add substantial text
-                            batch_text += f"\n--- Page {page_num + 1} ---\n" + cleaned_text
-                except Exception as e:
-                    print(f"    ⚠️ Error on page {page_num + 1}: {e}")
-                    continue
-            
-            if not batch_text.strip():
-                print(f"    ⚠️ No text extracted from pages {batch_start + 1}-{batch_end}")
-                continue
-            
-            # Split into chunks
-            try:
-                chunks = splitter.split_text(batch_text)
-                print(f"    ✅ Created {len(chunks)} chunks from pages {batch_start + 1}-{batch_end}")
+        if workers == 1:
+            reader = open_pdf(pdf_path)
+            for start, end in shards:
+                yield renumber(_extract_pages(pdf_path, volume_num, start, end, total_pages, file_size_mb, reader))
+        else:
+            # Spawned workers don't inherit the server's threads, locks or DB sockets
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_pdf_worker, initargs=(pdf_path,)) as executor:
+                # Only a couple of shards per worker run ahead of the consumer, so a slow
+                # embedding stage holds back extraction instead of buffering the volume
+                remaining = iter(shards)
                 
-                for chunk_idx, chunk in enumerate(chunks):
-                    if len(chunk.strip()) < 50:  # Skip tiny chunks
-                        continue
-                    
-                    # Separate Arabic and English
-                    arabic, english = split_arabic_english(chunk)
-                    
-                    # Extract metadata
-                    metadata = extract_hadith_metadata(chunk, volume_num)
-                    metadata['pages_processed'] = f"{batch_start + 1}-{batch_end}"
-                    metadata['total_pages'] = total_pages
-                    metadata['file_size_mb'] = round(file_size_mb, 1)
-                    
-                    chunk_data = {
-                        'volume_number': volume_num,
-                        'arabic_text': arabic,
-                        'english_text': english,
-                        'full_text': chunk,
-                        'chunk_index': len(all_chunks),
-                        'metadata': metadata
-                    }
-                    
-                    all_chunks.append(chunk_data)
+                def submit_next() -> Optional[Future]:
+                    shard = next(remaining, None)
+                    if shard is None:
+                        return None
+                    return executor.submit(_extract_pages, pdf_path, volume_num, *shard, total_pages, file_size_mb)
                 
-            except Exception as e:
-                print(f"    ❌ Error processing batch {batch_start + 1}-{batch_end}: {e}")
-                continue
-            
-            # Memory cleanup after each batch
-            del batch_text, chunks
-            gc.collect()
+                futures = deque(f for f in (submit_next() for _ in range(workers * 2)) if f is not None)
+                while futures:
+                    chunks = futures.popleft().result()
+                    future = submit_next()
+                    if future is not None:
+                        futures.append(future)
+                    yield renumber(chunks)
         
-        print(f"✅ Total chunks created: {len(all_chunks)} from {pages_to_process} pages")
-        return all_chunks
+        print(f"✅ Total chunks created: {total_chunks} from {pages_to_process} pages")
         
     except Exception as e:
         print(f"❌ PDF processing error: {str(e)}")
         raise Exception(f"Error processing PDF: {str(e)}")
 
-def generate_embeddings(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
-    """Generate embeddings for text chunks - OPTIMIZED"""
-    embeddings = []
+def process_pdf_text_parallel(pdf_path: str, volume_num: int, max_pages: int = MAX_PAGES_PER_VOLUME,
+                              workers: Optional[int] = None) -> List[Dict]:
+    """Process PDF page shards across worker processes; same chunks as process_pdf_text"""
+    return [chunk for shard in iter_pdf_chunks(pdf_path, volume_num, max_pages, workers) for chunk in shard]
+
+def _embed_documents(content):
+    """embed_content for documents, retried with exponential backoff while rate limited (HTTP 429)"""
+    for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        try:
+            return genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=content,
+                task_type="RETRIEVAL_DOCUMENT"
+            )
+        except (ResourceExhausted, TooManyRequests):
+            if attempt == EMBEDDING_MAX_RETRIES:
+                raise
+            # Jitter keeps concurrent batches from retrying in lockstep
+            delay = EMBEDDING_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"    ⏳ Rate limited, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _embed_one(text: str, position: int) -> np.ndarray:
+    """Embed a single document text, or a zero vector on failure"""
+    try:
+        result = _embed_documents(text)
+        if 'embedding' in result and result['embedding']:
+            return np.asarray(result['embedding'], dtype=np.float32)
+        print(f"    ⚠️ Empty embedding for text {position}")
+    except Exception as e:
+        print(f"    ❌ Embedding error for text {position}: {str(e)}")
+        time.sleep(1)  # Wait longer on error
+    return np.zeros(768, dtype=np.float32)
+
+def _embed_batch(batch: List[str], indices: List[int], batch_num: int) -> np.ndarray:
+    """Embed one batch in a single API request, falling back to one request per text"""
+    try:
+        result = _embed_documents(batch)
+        vectors = result.get('embedding') or []
+        if len(vectors) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        return np.asarray(vectors, dtype=np.float32)
+    except (ResourceExhausted, TooManyRequests) as e:
+        # Still rate limited after backoff; per-text requests would only add load
+        print(f"    ❌ Batch {batch_num} rate limited after {EMBEDDING_MAX_RETRIES} retries: {str(e)}")
+        return np.zeros((len(batch), 768), dtype=np.float32)
+    except Exception as e:
+        # Retry the texts one by one so one bad text doesn't zero the whole batch
+        print(f"    ⚠️ Batch {batch_num} failed ({str(e)}), embedding texts individually")
+        vectors = np.zeros((len(batch), 768), dtype=np.float32)
+        for row, (idx, text) in enumerate(zip(indices, batch)):
+            vectors[row] = _embed_one(text, idx + 1)
+            time.sleep(PROCESSING_DELAY)
+        return vectors
+
+def generate_embeddings(texts: List[str], batch_size: Optional[int] = None,
+                        concurrency: int = 1) -> np.ndarray:
+    """Generate embeddings for text chunks as one (len(texts), 768) float32 array
+
+    Each batch is a single API request of up to EMBEDDING_API_MAX_BATCH texts, with up to
+    concurrency requests in flight. With no batch_size, the size follows EMBEDDING_BATCH,
+    which adapts to API latency.
+    """
     total_texts = len(texts)
+    embeddings = np.zeros((total_texts, 768), dtype=np.float32)
+    
+    print(f"🔄 Generating embeddings for {total_texts} texts "
+          f"(batch size: {batch_size or 'adaptive'}, concurrency: {concurrency})")
+    configure_genai()
     
-    print(f"🔄 Generating embeddings for {total_texts} texts (batch size: {batch_size})")
+    # Similar lengths share a batch so one long text doesn't slow a batch of short ones
+    order = sorted(range(total_texts), key=lambda idx: len(texts[idx]))
+    done = 0
+    progress_lock = threading.Lock()
     
-    for i in range(0, total_texts, batch_size):
-        batch = texts[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (total_texts + batch_size - 1) // batch_size
+    def run_batch(indices: List[int], batch_num: int):
+        nonlocal done
+        # Limit text length more aggressively
+        batch = [texts[idx][:MAX_CHUNK_LENGTH] for idx in indices]
         
-        print(f"  ⚡ Processing embedding batch {batch_num}/{total_batches}")
+        started = time.perf_counter()
+        embeddings[indices] = _embed_batch(batch, indices, batch_num)
+        # Adapt only on sequential runs, where latency isn't inflated by sibling requests
+        if batch_size is None and concurrency <= 1:
+            EMBEDDING_BATCH.record((time.perf_counter() - started) * 1000)
         
-        for j, text in enumerate(batch):
-            try:
-                # Limit text length more aggressively
-                limited_text = text[:4000] if len(text) > 4000 else text
-                
-                result = genai.embed_content(
-                    model=EMBEDDING_MODEL,
-                    content=limited_text,
-                    task_type="RETRIEVAL_DOCUMENT"
-                )
-                
-                if 'embedding' in result and result['embedding']:
-                    embeddings.append(result['embedding'])
-                else:
-                    print(f"    ⚠️ Empty embedding for text {i + j + 1}")
-                    embeddings.append([0.0] * 768)
-                
-                # Longer delay to avoid rate limits
+        with progress_lock:
+            done += len(batch)
+            print(f"  ⚡ Embedded batch {batch_num} ({done}/{total_texts} texts)")
+    
+    if concurrency <= 1:
+        i = 0
+        batch_num = 0
+        while i < total_texts:
+            size = min(batch_size or EMBEDDING_BATCH.current, EMBEDDING_API_MAX_BATCH)
+            batch_num += 1
+            run_batch(order[i:i + size], batch_num)
+            i += size
+            
+            # Delay between requests to avoid rate limits
+            if i < total_texts:
                 time.sleep(PROCESSING_DELAY)
-                
-            except Exception as e:
-                print(f"    ❌ Embedding error for text {i + j + 1}: {str(e)}")
-                embeddings.append([0.0] * 768)
-                time.sleep(1)  # Wait longer on error
-        
-        # Additional delay between batches
-        if batch_num < total_batches:
-            time.sleep(2)
-    
-    valid_embeddings = sum(1 for emb in embeddings if not all(x == 0.0 for x in emb))
-    print(f"✅ Generated {valid_embeddings}/{len(embeddings)} valid embeddings")
+    else:
+        # Batches are fixed up front; each lands in its own rows, so completion order doesn't matter
+        size = min(batch_size or EMBEDDING_BATCH.current, EMBEDDING_API_MAX_BATCH)
+        batches = [order[i:i + size] for i in range(0, total_texts, size)]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(run_batch, indices, n) for n, indices in enumerate(batches, 1)]
+            for future in futures:
+                future.result()
+    
+    # Unit length, so search can rank by inner product; zero (failed) rows stay zero
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+    
+    valid_embeddings = int((norms > 0).sum())
+    print(f"✅ Generated {valid_embeddings}/{total_texts} valid embeddings")
     
     return embeddings
 
+class EmbeddingBatcher:
+    """Coalesce concurrent single-text embedding calls into batched API requests"""
+    
+    def __init__(self, task_type: str, max_batch_size: int = EMBEDDING_DYNAMIC_BATCH_MAX,
+                 timeout_ms: int = EMBEDDING_BATCH_TIMEOUT_MS):
+        self.task_type = task_type
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def embed(self, text: str) -> List[float]:
+        """Queue one text and block until its batch has been embedded"""
+        future = Future()
+        self._queue.put((text, future))
+        self._ensure_worker()
+        return future.result()
+    
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.timeout
+            
+            # Keep collecting until the batch is full or the window closes
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            self._flush(batch)
+    
+    def _flush(self, batch: List[tuple]):
+        texts = [text for text, _ in batch]
+        try:
+            configure_genai()
+            result = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=texts,
+                task_type=self.task_type
+            )
+            vectors = result.get('embedding') or []
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+_query_batcher = EmbeddingBatcher(task_type="RETRIEVAL_QUERY")
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so trivially different spellings share cache entries"""
+    return ' '.join(query.split())
+
+# Query embeddings as float16 bytes (1.5 KB each), keyed by SHA-256 of the exact string
+# sent to the API. FP16 is the precision of the stored embedding_h column, so searches see the same vector
+_query_embeddings = make_ttl_cache('emb16', QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+
+def query_embedding_cache_stats() -> Dict[str, int]:
+    """Size and hit/miss counters of the query embedding cache"""
+    return _query_embeddings.stats()
+
+# Cache misses currently being embedded, so concurrent repeats of a query share one API call
+_query_embeddings_inflight: Dict[str, Future] = {}
+_query_embeddings_inflight_lock = threading.Lock()
+
 def generate_query_embedding(query: str) -> List[float]:
     """Generate embedding for search query - FIXED VERSION"""
+    normalized = normalize_query(query)
+    key = hashlib.sha256(normalized.encode()).hexdigest()
+    
+    cached = _query_embeddings.get(key)
+    if cached is not None:
+        return np.frombuffer(cached, dtype=np.float16).astype(np.float32).tolist()
+    
+    with _query_embeddings_inflight_lock:
+        pending = _query_embeddings_inflight.get(key)
+        if pending is None:
+            future = _query_embeddings_inflight[key] = Future()
+    if pending is not None:
+        return pending.result()
+    
     try:
-        result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=query,
-            task_type="RETRIEVAL_QUERY"
-        )
+        embedding = _embed_query(query, normalized, key)
+        future.set_result(embedding)
+        return embedding
+    except BaseException as e:
+        # Waiters would otherwise block forever on a future nobody resolves
+        future.set_exception(e)
+        raise
+    finally:
+        with _query_embeddings_inflight_lock:
+            del _query_embeddings_inflight[key]
+
+def _embed_query(query: str, normalized: str, key: str) -> List[float]:
+    """Embed a query through the batcher and cache it; a zero vector on failure"""
+    try:
+        embedding = _query_batcher.embed(normalized)
         
-        if 'embedding' in result:
-            return result['embedding']
+        if embedding:
+            vector = np.asarray(embedding, dtype=np.float16)
+            _query_embeddings.set(key, vector.tobytes())
+            return vector.astype(np.float32).tolist()
         else:
-            print(f"❌ No embedding in result: {result}")
+            print(f"❌ Empty embedding for query: {query}")
             return [0.0] * 768
-            
+        
     except Exception as e:
         print(f"❌ Embedding generation error: {e}")
         # Return zero embedding as fallback
         return [0.0] * 768
 
+# Only exclude obvious non-content: pure TOC, index and header lines
+_EXCLUDE_RE = re.compile(
+    r'^(?:table of contents'
+    r'|overall.*index'
+    r'|bihar al-anwaar\s+volume \d+)$',
+    re.IGNORECASE
+)
+
+# Hadith indicators, matched case-insensitively on the raw text
+_HADITH_RE = re.compile(
+    r'said.*asws|narrated|reported|tradition|hadith'
+    r'|قال|عن|حدثنا|روى'
+    r'|chapter \d+'        # Chapter headers are content
+    r'|knowledge|علم',      # For knowledge-related queries
+    re.IGNORECASE
+)
+
+_CHAPTER_QUERY_RE = re.compile(r'chapter\s+(\d+)')
+_WORD_RE = re.compile(r'\b\w{3,}\b')  # Only words 3+ chars
+_KNOWLEDGE_TERMS = ('knowledge', 'learn', 'scholar', 'علم', 'طلب', 'عالم')
+
 def filter_relevant_chunks(chunks: List[Dict], query: str) -> List[Dict]:
     """FIXED: Filter out irrelevant chunks but keep actual content"""
     
     filtered_chunks = []
     
-    # Much more restrictive exclude patterns - only exclude obvious non-content
-    exclude_patterns = [
-        r'^table of contents$',           # Only pure TOC lines
-        r'^overall.*index$',              # Only pure index lines  
-        r'^bihar al-anwaar\s+volume \d+$', # Only pure headers
-    ]
-    
-    # Keep hadith indicators
-    include_patterns = [
-        r'said.*asws',
-        r'narrated',
-        r'reported', 
-        r'tradition',
-        r'hadith',
-        r'قال',
-        r'عن',
-        r'حدثنا',
-        r'روى',
-        r'chapter \d+',                   # Chapter headers are content
-        r'knowledge',                     # For knowledge-related queries
-        r'علم',                           # Arabic for knowledge
-    ]
-    
     for chunk in chunks:
-        full_text = chunk.get('full_text', '').lower().strip()
-        english_text = chunk.get('english_text', '').lower()
+        full_text = (chunk.get('full_text') or '').strip()
+        english_text = chunk.get('english_text') or ''
         
         # Only exclude if it's PURELY navigation (very restrictive)
-        should_exclude = False
-        for pattern in exclude_patterns:
-            if re.match(pattern, full_text):  # Only exact matches
-                should_exclude = True
-                break
+        should_exclude = _EXCLUDE_RE.match(full_text) is not None
         
         # If text is very short and has no content indicators, exclude
-        if len(full_text) < 50 and not any(re.search(p, full_text) for p in include_patterns):
+        if len(full_text) < 50 and not _HADITH_RE.search(full_text):
             should_exclude = True
         
         if not should_exclude:
             # Check for hadith content
-            has_hadith_content = any(re.search(pattern, english_text) for pattern in include_patterns)
+            has_hadith_content = _HADITH_RE.search(english_text) is not None
             
             # Check query relevance
             is_relevant = _is_relevant_to_query(chunk, query)
@@ -346,12 +594,11 @@ def _is_relevant_to_query(chunk: Dict, query: str) -> bool:
     """IMPROVED: More permissive relevance checking"""
     
     query_lower = query.lower()
-    full_text = chunk.get('full_text', '').lower()
-    english_text = chunk.get('english_text', '').lower()
+    full_text = (chunk.get('full_text') or '').lower()
     
     # For chapter-specific queries
     if 'chapter' in query_lower:
-        chapter_match = re.search(r'chapter\s+(\d+)', query_lower)
+        chapter_match = _CHAPTER_QUERY_RE.search(query_lower)
         if chapter_match:
             requested_chapter = chapter_match.group(1)
             chunk_chapter = chunk.get('chapter_name')
@@ -366,34 +613,35 @@ def _is_relevant_to_query(chunk: Dict, query: str) -> bool:
     
     # For knowledge-related queries (more specific)
     if 'knowledge' in query_lower:
-        knowledge_terms = ['knowledge', 'learn', 'scholar', 'علم', 'طلب', 'عالم']
-        if any(term in full_text or term in english_text for term in knowledge_terms):
+        english_text = (chunk.get('english_text') or '').lower()
+        if any(term in full_text or term in english_text for term in _KNOWLEDGE_TERMS):
             return True
     
     # For general concept queries, use term overlap
-    query_terms = re.findall(r'\b\w{3,}\b', query_lower)  # Only words 3+ chars
-    text_words = set(re.findall(r'\b\w{3,}\b', full_text))
+    query_terms = _WORD_RE.findall(query_lower)
     
     if query_terms:
+        text_words = set(_WORD_RE.findall(full_text))
         overlap = len(set(query_terms) & text_words)
         overlap_ratio = overlap / len(query_terms)
         return overlap_ratio > 0.15  # Lowered from 0.2 to 0.15
     
     return True  # Default to include if no specific exclusion
 
+# Common AI disclaimers stripped from generated answers
+_DISCLAIMER_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'as an ai.*?,',
+    r'based on my knowledge.*?,',
+    r'in islamic tradition.*?,',
+    r'generally speaking.*?,',
+))
+
 def _post_process_response(answer: str, references: List[str]) -> str:
     """Clean up and validate the AI response"""
     
     # Remove common AI disclaimers
-    disclaimer_patterns = [
-        r'as an ai.*?,',
-        r'based on my knowledge.*?,',
-        r'in islamic tradition.*?,',
-        r'generally speaking.*?,',
-    ]
-    
-    for pattern in disclaimer_patterns:
-        answer = re.sub(pattern, '', answer, flags=re.IGNORECASE)
+    for pattern in _DISCLAIMER_PATTERNS:
+        answer = pattern.sub('', answer)
     
     # Ensure response starts directly with content
     answer = answer.strip()
@@ -456,9 +704,8 @@ def generate_answer_with_context(query: str, chunks: List[Dict], include_arabic:
     context = "\n".join(context_parts)
     
     # Create enhanced prompt
-    prompt = f"""{ENHANCED_SYSTEM_PROMPT}
-
-EXCERPTS FROM BIHAR UL ANWAR:
+    # ENHANCED_SYSTEM_PROMPT is the chat model's system instruction, so it is not repeated here
+    prompt = f"""EXCERPTS FROM BIHAR UL ANWAR:
 {context}
 
 USER QUESTION: {query}
@@ -475,7 +722,7 @@ ANSWER:"""
             candidate_count=1,
         )
         
-        response = CHAT_MODEL.generate_content(
+        response = get_chat_model().generate_content(
             prompt,
             generation_config=generation_config
         )
@@ -0,0 +1,25 @@
+# reindex.py - Rebuild the embedding indexes after bulk ingestion
+import sys
+import os
+import logging
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import reindex_vector_indexes, close_db_connection
+
+def main():
+    """Rebuild every HNSW embedding index concurrently, then refresh planner statistics"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print("🔧 BIHAR UL ANWAR INDEX REBUILD")
+    print("=" * 50)
+    
+    try:
+        indexes = reindex_vector_indexes()
+        print(f"✅ Rebuilt {len(indexes)} indexes")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        close_db_connection()
+
+if __name__ == "__main__":
+    main()